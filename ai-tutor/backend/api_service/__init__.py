@@ -32,6 +32,7 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = ACCESS_EXPIRES
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
 
     # Initialize Flask extensions with the app
     db.init_app(app)
@@ -40,16 +41,25 @@ def create_app():
     migrate.init_app(app, db)
 
     with app.app_context():
-        from .main import main as main_blueprint
+        from .main import main as main_blueprint, limiter
         from .auth import auth as auth_blueprint
         from .courses import courses as courses_blueprint
         from .populate_courses import populate_courses as populate_courses_blueprint
 
         app.register_blueprint(main_blueprint)
+        limiter.init_app(app)
         app.register_blueprint(auth_blueprint, url_prefix='/auth')
         app.register_blueprint(courses_blueprint, url_prefix='/courses')
         app.register_blueprint(populate_courses_blueprint)
 
         db.create_all()
 
+        # Roadmap pages are served from memory, so read the flowcharts up front
+        from .flowcharts import flowchart_store
+        flowchart_store.load_all()
+
+        # Expired blocklist rows are purged off the request path
+        from .revocation import start_blocklist_purger
+        start_blocklist_purger(app)
+
     return app
\ No newline at end of file
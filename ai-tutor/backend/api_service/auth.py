@@ -1,26 +1,34 @@
 from flask import Blueprint, request, jsonify
 from .models import *
-from api_service import db, bcrypt, jwt
+from .conversation import clear_context
+from .enrollment import enrollment_cache
+from .passwords import password_hasher, PasswordHasherBusy
+from .revocation import revocation_cache, purge_expired_tokens
+from api_service import db, jwt
 from flask_jwt_extended import create_access_token, get_jwt, jwt_required, unset_jwt_cookies, get_jwt_identity
 
 auth = Blueprint('auth', __name__)
 
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload: dict) -> bool:
-    jti = jwt_payload["jti"]
-    token = db.session.query(TokenBlocklist.id).filter_by(jti=jti).scalar()
+    return revocation_cache.is_revoked(jwt_payload["jti"])
 
-    return token is not None
+@auth.cli.command('purge-blocklist')
+def purge_blocklist():
+    """Delete blocklisted tokens that have expired."""
+    print(f"Removed {purge_expired_tokens()} expired tokens from the blocklist")
 
 @auth.route('/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
-        hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        hashed_password = password_hasher.hash(data['password'])
         new_user = User(username=data['username'], email=data['email'], password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
         return jsonify({"message": "User registered successfully", "user": {"username": new_user.username, "email": new_user.email}}), 201
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -30,10 +38,17 @@ def login():
     try:
         data = request.get_json()
         user = User.query.filter_by(email=data['email']).first()
-        if user and bcrypt.check_password_hash(user.password, data['password']):
+        if user and password_hasher.check(user.password, data['password']):
+            # Move the stored hash to the configured work factor while the password is at hand
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(data['password'])
+                db.session.commit()
+
             access_token = create_access_token(identity=user.username)
             return jsonify(access_token=access_token, user={"username": user.username, "email": user.email}), 200
         return jsonify({"message": "Invalid credentials"}), 401
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -45,6 +60,7 @@ def logout():
         now = datetime.now(timezone.utc)
         db.session.add(TokenBlocklist(jti=jti, created_at=now))
         db.session.commit()
+        revocation_cache.revoke(jti, now)
         return jsonify(msg="JWT revoked")
         # response = jsonify({"message": "User logged out successfully"})
         # unset_jwt_cookies(response)
@@ -66,6 +82,7 @@ def delete_questions(course_code):
 
         # Delete all questions for the authenticated user and specified course
         Question.query.filter_by(user_id=user_id, course_code=course_code).delete()
+        clear_context(user_id, course_code)
         db.session.commit()
         return jsonify({"message": "All questions and answers for the specified course deleted successfully"}), 200
     except Exception as e:
@@ -99,10 +116,14 @@ def delete_user():
                 )
             )
 
+        # Delete the stored conversation contexts
+        clear_context(user_id)
+
         # Delete the user record
         db.session.query(User).filter(User.id == user_id).delete()
 
         db.session.commit()
+        enrollment_cache.invalidate(user_id)
         return jsonify({"message": "User and all associated entries deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
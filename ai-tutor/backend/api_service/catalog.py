@@ -0,0 +1,76 @@
+from .models import CatalogVersion, Course
+from .rag_client import get_rag_service_url
+from api_service import db
+import hashlib
+import json
+import os
+import threading
+import time
+
+# How often a worker compares its snapshot with the shared catalog version, bounding how
+# long a change made through another worker goes unnoticed here
+CATALOG_VERSION_CHECK_SECONDS = float(os.getenv("CATALOG_VERSION_CHECK_SECONDS", 2))
+# Flowchart files and RAG service settings are not versioned, so the snapshot is also rebuilt after this
+CATALOG_SNAPSHOT_TTL = float(os.getenv("CATALOG_SNAPSHOT_TTL", 300))
+
+class CatalogSnapshot:
+    """Serialized course catalog and its strong ETag, rebuilt only when the catalog changes.
+
+    Changes are announced through the version row in `CatalogVersion`, which each
+    worker reads at most once every `check_interval` seconds instead of
+    rebuilding the catalog on every request.
+    """
+
+    def __init__(self, ttl=CATALOG_SNAPSHOT_TTL, check_interval=CATALOG_VERSION_CHECK_SECONDS):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._body = None
+        self._etag = None
+        self._version = None
+        self._expires_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._body is None or now >= self._expires_at:
+                self._rebuild()
+            elif now >= self._checked_at + self.check_interval:
+                self._checked_at = now
+                if _current_version() != self._version:
+                    self._rebuild()
+            return self._body, self._etag
+
+    def invalidate(self):
+        """Announce a catalog change to every worker; takes effect when the caller commits."""
+        bumped = db.session.query(CatalogVersion).filter_by(id=1)\
+            .update({CatalogVersion.version: CatalogVersion.version + 1}, synchronize_session=False)
+        if not bumped:
+            db.session.add(CatalogVersion(id=1, version=1))
+        with self._lock:
+            self._expires_at = 0.0
+
+    def _rebuild(self):
+        # Read first, so a change committed while rebuilding is caught by the next check
+        self._version = _current_version()
+        course_list = []
+        for course in db.session.query(Course).order_by(Course.code).all():
+            course_code = course.code.upper()
+            course_list.append({
+                "code": course.code,
+                "name": course.name,
+                "description": course.description,
+                "has_roadmap": os.path.isfile(f'assets/{course_code}_flowchart.txt'),
+                "has_chatbot": bool(get_rag_service_url(course_code))
+            })
+
+        self._body = json.dumps({"courses": course_list}).encode('utf-8')
+        self._etag = hashlib.sha256(self._body).hexdigest()[:32]
+        self._checked_at = time.monotonic()
+        self._expires_at = self._checked_at + self.ttl
+
+def _current_version():
+    return db.session.query(CatalogVersion.version).filter_by(id=1).scalar() or 0
+
+catalog_snapshot = CatalogSnapshot()
@@ -0,0 +1,86 @@
+from .models import ConversationContext, Question
+from api_service import db
+from html import escape
+import os
+import re
+
+# Number of most recent turns sent verbatim to the RAG service
+CONVERSATION_WINDOW_TURNS = int(os.getenv("CONVERSATION_WINDOW_TURNS", 6))
+# Upper bound on the rolling summary of turns that fell out of the window
+CONVERSATION_SUMMARY_CHARS = int(os.getenv("CONVERSATION_SUMMARY_CHARS", 3000))
+# How much of an evicted question and of its answer is kept in the summary
+SUMMARY_QUESTION_CHARS = 200
+SUMMARY_ANSWER_CHARS = 300
+# Older turns read when a context is built for an existing history
+BACKFILL_SUMMARY_TURNS = 10
+
+def sanitize_input(text: str) -> str:
+    # Remove potentially harmful HTML tags and attributes
+    sanitized_text = escape(text)
+    # Further remove any non-alphanumeric characters, except spaces
+    sanitized_text = re.sub(r'[^\w\s]', '', sanitized_text)
+    return sanitized_text.strip()
+
+def get_context(user_id, course_code) -> ConversationContext:
+    """Return the conversation context for a user and course, building it on first use."""
+    context = db.session.get(ConversationContext, (user_id, course_code))
+    if context is None:
+        context = _build_context(user_id, course_code)
+    return context
+
+def _build_context(user_id, course_code) -> ConversationContext:
+    # Only the newest turns are read, so existing long histories stay bounded too
+    latest = db.session.query(Question).filter_by(user_id=user_id, course_code=course_code)\
+        .order_by(Question.created_at.desc(), Question.id.desc())\
+        .limit(CONVERSATION_WINDOW_TURNS + BACKFILL_SUMMARY_TURNS).all()
+
+    context = ConversationContext(user_id=user_id, course_code=course_code, recent_turns=[], summary='', turn_count=0)
+    for qa in reversed(latest):
+        append_turn(context, qa.question_text, qa.answer_text)
+
+    db.session.add(context)
+    return context
+
+def append_turn(context: ConversationContext, question_text: str, answer_text: str):
+    """Add a new turn to the window, folding any evicted turns into the summary.
+
+    Text is sanitized here once and stored, so later requests can send it as is.
+    """
+    # Assign new objects so SQLAlchemy notices the change to the JSON column
+    turns = list(context.recent_turns or [])
+    turns.append({"question": sanitize_input(question_text or ''), "answer": sanitize_input(answer_text or '')})
+
+    summary = context.summary or ''
+    while len(turns) > CONVERSATION_WINDOW_TURNS:
+        summary = _fold_into_summary(summary, turns.pop(0))
+
+    context.recent_turns = turns
+    context.summary = summary
+    context.turn_count = (context.turn_count or 0) + 1
+
+def _fold_into_summary(summary: str, turn: dict) -> str:
+    """Add an evicted turn to the summary as one line holding its question and the start of its answer.
+
+    The summary is extractive rather than generated, so keeping it up to date
+    costs no model call; the answer snippet keeps what the tutor already
+    explained available to follow-up questions.
+    """
+    lines = summary.splitlines() if summary else []
+    question = turn['question'][:SUMMARY_QUESTION_CHARS]
+    answer = turn['answer'][:SUMMARY_ANSWER_CHARS]
+    lines.append(f"- Q: {question} A: {answer}" if answer else f"- Q: {question}")
+
+    # Drop the oldest turns once the summary exceeds its budget
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > CONVERSATION_SUMMARY_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def context_payload(context: ConversationContext) -> dict:
+    return {"message_history": list(context.recent_turns or []), "summary": context.summary or ''}
+
+def clear_context(user_id, course_code=None):
+    """Delete stored contexts for a user, either for one course or all of them."""
+    query = db.session.query(ConversationContext).filter(ConversationContext.user_id == user_id)
+    if course_code is not None:
+        query = query.filter(ConversationContext.course_code == course_code)
+    query.delete(synchronize_session=False)
@@ -1,19 +1,31 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .models import *
-from .main import get_rag_service_url
+from .conversation import clear_context
+from .enrollment import enrollment_cache
+from .catalog import catalog_snapshot
+from .flowcharts import flowchart_store
 from api_service import db
-import os
 
 courses = Blueprint('courses', __name__)
 
 @courses.route('/get-flowchart/<course_code>', methods=['GET'])
 def get_flowchart(course_code):
-    file_path = os.getenv(f'{course_code.upper()}_FLOWCHART')
     try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-        return content
+        flowchart = flowchart_store.get(course_code)
+        if flowchart is None:
+            return jsonify({"error": "Flowchart not found"}), 404
+
+        body, encoding = flowchart.body(request.accept_encodings)
+        response = Response(body, mimetype=flowchart.mimetype)
+        if encoding != "identity":
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        # Each encoding is a different representation, so it needs its own strong ETag
+        response.set_etag(flowchart.etag if encoding == "identity" else f"{flowchart.etag}-{encoding}")
+        response.last_modified = flowchart.last_modified
+        return response.make_conditional(request)
     except FileNotFoundError:
         return jsonify({"error": "Flowchart not found"}), 404
     except Exception as e:
@@ -25,8 +37,7 @@ def add_user_to_course(course_code):
     user_id = get_jwt_identity()
 
     # Check if the user is already enrolled in the course
-    enrollment = db.session.query(user_courses).filter_by(user_id=user_id, course_code=course_code).first()
-    if enrollment:
+    if enrollment_cache.is_enrolled(user_id, course_code):
         return jsonify({"error": "User already enrolled in the course"}), 400
 
     try:
@@ -34,6 +45,7 @@ def add_user_to_course(course_code):
         new_enrollment = user_courses.insert().values(user_id=user_id, course_code=course_code)
         db.session.execute(new_enrollment)
         db.session.commit()
+        enrollment_cache.add(user_id, course_code)
         return jsonify({"message": "User added to course successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -46,12 +58,14 @@ def drop_course(course_code):
     try:
         # Delete all questions for the authenticated user and specified course
         Question.query.filter_by(user_id=user_id, course_code=course_code).delete()
+        clear_context(user_id, course_code)
 
         # Delete the user's enrollment in the course
         delete_enrollment = user_courses.delete().where(user_courses.c.user_id == user_id, user_courses.c.course_code == course_code)
         db.session.execute(delete_enrollment)
 
         db.session.commit()
+        enrollment_cache.remove(user_id, course_code)
         return jsonify({"message": "Course dropped and all associated questions deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -73,19 +87,11 @@ def get_user_courses():
 @courses.route('/', methods=['GET'])
 def get_available_courses():
     try:
-        courses = db.session.query(Course).all()
-        course_list = []
-        for course in courses:
-            course_code = course.code.upper()
-            roadmap_exists = os.path.isfile(f'assets/{course_code}_flowchart.txt')
-            chatbot_exists = bool(get_rag_service_url(course_code))
-            course_list.append({
-                "code": course.code,
-                "name": course.name,
-                "description": course.description,
-                "has_roadmap": roadmap_exists,
-                "has_chatbot": chatbot_exists
-            })
-        return jsonify({"courses": course_list}), 200
+        body, etag = catalog_snapshot.get()
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Browsers revalidate every time and get 304 Not Modified until the catalog changes
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
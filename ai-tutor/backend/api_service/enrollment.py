@@ -0,0 +1,87 @@
+from .models import user_courses
+from api_service import db
+from collections import OrderedDict
+import os
+import threading
+import time
+
+# Users whose enrollments are kept in memory per worker
+ENROLLMENT_CACHE_SIZE = int(os.getenv("ENROLLMENT_CACHE_SIZE", 10000))
+# Bounds how long a change made through another worker can go unnoticed here
+ENROLLMENT_CACHE_TTL = float(os.getenv("ENROLLMENT_CACHE_TTL", 60))
+
+class EnrollmentCache:
+    """LRU cache of the course codes each user is enrolled in.
+
+    A user's courses are loaded with one query on first access. The endpoints
+    that change enrollments write through to it after committing.
+    """
+
+    def __init__(self, max_size=ENROLLMENT_CACHE_SIZE, ttl=ENROLLMENT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_enrolled(self, user_id, course_code) -> bool:
+        courses, cached = self._lookup(user_id)
+        if course_code in courses or not cached:
+            return course_code in courses
+
+        # Negative answers are rare and may predate an enrollment made through another worker
+        courses, _ = self._load(user_id)
+        return course_code in courses
+
+    def get_courses(self, user_id) -> frozenset:
+        return self._lookup(user_id)[0]
+
+    def _lookup(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0], True
+            self.misses += 1
+        return self._load(user_id)
+
+    def _load(self, user_id):
+        rows = db.session.query(user_courses.c.course_code).filter(user_courses.c.user_id == user_id).all()
+        courses = frozenset(row[0] for row in rows)
+        self._store(user_id, courses)
+        return courses, False
+
+    def add(self, user_id, course_code):
+        self._update(user_id, lambda courses: courses | {course_code})
+
+    def remove(self, user_id, course_code):
+        self._update(user_id, lambda courses: courses - {course_code})
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+    def _update(self, user_id, change):
+        # Users that are not cached are simply loaded fresh on their next access
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._store_locked(user_id, change(entry[0]))
+
+    def _store(self, user_id, courses):
+        with self._lock:
+            self._store_locked(user_id, courses)
+
+    def _store_locked(self, user_id, courses):
+        self._entries[user_id] = (courses, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+enrollment_cache = EnrollmentCache()
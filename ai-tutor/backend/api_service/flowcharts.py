@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# How often a served flowchart's file is stat'ed to pick up edits
+FLOWCHART_CHECK_SECONDS = float(os.getenv("FLOWCHART_CHECK_SECONDS", 30))
+
+class Flowchart:
+    """A flowchart file held in memory, together with its precompressed variants."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        with open(path, 'rb') as file:
+            content = file.read()
+
+        self.bodies = {"identity": content, "gzip": gzip.compress(content, compresslevel=9)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(content)
+
+        self.etag = hashlib.sha256(content).hexdigest()[:32]
+        self.last_modified = datetime.fromtimestamp(self.mtime, timezone.utc)
+        self.mimetype = 'application/json' if path.endswith('.json') else 'text/plain'
+        self.checked_at = time.monotonic()
+
+    def body(self, accept_encodings):
+        """Return the smallest variant the client accepts and its encoding."""
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and accept_encodings[encoding]:
+                return self.bodies[encoding], encoding
+        return self.bodies["identity"], "identity"
+
+class FlowchartStore:
+    """Flowcharts configured through `{COURSE}_FLOWCHART` variables, keyed by course code."""
+
+    def __init__(self, check_interval=FLOWCHART_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._flowcharts = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        for key, path in os.environ.items():
+            if key.endswith('_FLOWCHART') and path:
+                try:
+                    self._load(key[:-len('_FLOWCHART')], path)
+                except OSError as e:
+                    logger.warning(f"Could not preload flowchart {path}: {e}")
+
+    def get(self, course_code):
+        """Return the flowchart for a course, or None if none is configured.
+
+        Raises FileNotFoundError if the configured file does not exist.
+        """
+        course_code = course_code.upper()
+        path = os.getenv(f'{course_code}_FLOWCHART')
+        if not path:
+            return None
+
+        flowchart = self._flowcharts.get(course_code)
+        if flowchart is None or flowchart.path != path:
+            return self._load(course_code, path)
+
+        if time.monotonic() - flowchart.checked_at >= self.check_interval:
+            flowchart.checked_at = time.monotonic()
+            if os.stat(path).st_mtime != flowchart.mtime:
+                return self._load(course_code, path)
+        return flowchart
+
+    def _load(self, course_code, path):
+        flowchart = Flowchart(path)
+        with self._lock:
+            self._flowcharts[course_code] = flowchart
+        return flowchart
+
+flowchart_store = FlowchartStore()
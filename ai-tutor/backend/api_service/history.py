@@ -0,0 +1,98 @@
+from .models import Question
+from api_service import db
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import os
+
+# Page size used when the client does not ask for one, and the largest allowed
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 200))
+# Rows fetched per round trip while streaming NDJSON, and the most one stream returns
+HISTORY_STREAM_BATCH = 100
+HISTORY_STREAM_MAX = int(os.getenv("HISTORY_STREAM_MAX", 10000))
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(question: Question) -> str:
+    raw = f"{question.created_at.isoformat()}|{question.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, question_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(question_id)
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+def serialize(question: Question) -> dict:
+    return {"question": question.question_text, "answer": question.answer_text, "sources": question.sources}
+
+def _keyset_filter(created_at, question_id, newer: bool):
+    if newer:
+        return or_(Question.created_at > created_at, and_(Question.created_at == created_at, Question.id > question_id))
+    return or_(Question.created_at < created_at, and_(Question.created_at == created_at, Question.id < question_id))
+
+def _history_query(user_id, course_code, before=None, after=None):
+    # Keyset on (created_at, id): rows sharing a timestamp are still paged exactly once
+    query = db.session.query(Question).filter(Question.user_id == user_id, Question.course_code == course_code)
+    if before:
+        query = query.filter(_keyset_filter(*decode_cursor(before), newer=False))
+    if after:
+        query = query.filter(_keyset_filter(*decode_cursor(after), newer=True))
+    return query
+
+def _oldest_key(query, limit):
+    """Return the (created_at, id) of the oldest of the newest `limit` rows of `query`.
+
+    Only the indexed key columns are read, walking back in keyset batches
+    rather than skipping rows with OFFSET.
+    """
+    keys = query.with_entities(Question.created_at, Question.id)\
+        .order_by(Question.created_at.desc(), Question.id.desc())
+    oldest, remaining = None, limit
+    while remaining > 0:
+        batch = (keys.filter(_keyset_filter(*oldest, newer=False)) if oldest else keys)\
+            .limit(min(remaining, HISTORY_STREAM_BATCH)).all()
+        if not batch:
+            break
+        oldest = tuple(batch[-1])
+        remaining -= len(batch)
+    return oldest
+
+def get_page(user_id, course_code, before=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """Return up to `limit` questions in chronological order and whether more exist.
+
+    Without `after` the page is the newest one before `before` (or overall), which
+    is what a chat view shows first; with `after` it is the oldest one after it.
+    """
+    query = _history_query(user_id, course_code, before, after)
+    if after:
+        rows = query.order_by(Question.created_at, Question.id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        rows = query.order_by(Question.created_at.desc(), Question.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+    return rows, has_more
+
+def iter_history(user_id, course_code, before=None, after=None, limit=HISTORY_STREAM_MAX):
+    """Yield up to `limit` questions in chronological order, fetching them in fixed-size batches.
+
+    As with `get_page`, these are the newest questions before `before` (or overall)
+    unless `after` is given, in which case they are the oldest ones after it.
+    """
+    limit = min(limit, HISTORY_STREAM_MAX)
+    query = _history_query(user_id, course_code, before, after)
+    if not after:
+        # Start from the oldest of the newest `limit` rows
+        oldest = _oldest_key(query, limit)
+        if oldest is not None:
+            created_at, question_id = oldest
+            query = query.filter(or_(_keyset_filter(created_at, question_id, newer=True),
+                                     and_(Question.created_at == created_at, Question.id == question_id)))
+    query = query.order_by(Question.created_at, Question.id).limit(limit)
+    for question in query.yield_per(HISTORY_STREAM_BATCH):
+        yield question
@@ -1,46 +1,82 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from .models import *
+# Imported to register the shm:// storage scheme with Flask-Limiter
+from .rate_limit_storage import SharedMemoryStorage
+from .conversation import sanitize_input, get_context, append_turn, context_payload, clear_context
+from .rag_client import RagServiceUnavailable, format_sse, get_rag_client, get_rag_service_url, iter_sse_events, rag_client_stats
+from .enrollment import enrollment_cache
+from .history import HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE, HISTORY_STREAM_MAX, InvalidCursor, decode_cursor, encode_cursor, get_page, iter_history, serialize
 from api_service import db
+from sqlalchemy.exc import IntegrityError
+import json
 import os
-import requests
-import re
-from html import escape
+import tempfile
 
 main = Blueprint('main', __name__)
 
+def default_rate_limit_storage():
+    # Counters live in shared memory so the workers on a host see each other's hits
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return f"shm://{directory}/ai-tutor-ratelimit"
+
 # Initialize Flask-Limiter
 limiter = Limiter(
     get_remote_address,
-    default_limits=["5 per minute"],
-    storage_uri="sqlalchemy:///backend/database.db"
+    storage_uri=os.getenv("RATELIMIT_STORAGE_URI", default_rate_limit_storage()),
+    strategy="sliding-window-counter"
 )
 
-def get_rag_service_url(course_code):
-    return os.getenv(f"RAG_SERVICE_{course_code}_URL")
-
 @main.route('/message_history/<course_code>', methods=['GET'])
 @jwt_required()
 def message_history(course_code):
     user_id = get_jwt_identity()
 
     # Check if the user is enrolled in the course
-    enrollment = db.session.query(user_courses).filter_by(user_id=user_id, course_code=course_code).first()
-    if not enrollment:
+    if not enrollment_cache.is_enrolled(user_id, course_code):
         return jsonify({"error": "User not enrolled in the course"}), 403
 
+    before = request.args.get('before')
+    after = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+    stream = request.args.get('stream', '').lower() in ('1', 'true') or request.accept_mimetypes.best == 'application/x-ndjson'
+
+    try:
+        for cursor in (before, after):
+            if cursor:
+                decode_cursor(cursor)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    if stream:
+        # One JSON object per line, read from the database in fixed-size batches
+        def generate():
+            for qa in iter_history(user_id, course_code, before, after, limit or HISTORY_STREAM_MAX):
+                yield json.dumps({**serialize(qa), "cursor": encode_cursor(qa)}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     try:
-        # Retrieve all questions and answers for the specific course
-        questions_and_answers = db.session.query(Question).filter_by(user_id=user_id, course_code=course_code).order_by(Question.created_at).all()
+        # Retrieve one page of questions and answers for the specific course
+        limit = min(limit or HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+        questions_and_answers, has_more = get_page(user_id, course_code, before, after, limit)
 
-        if not questions_and_answers:
+        if not questions_and_answers and not (before or after):
             return jsonify({"message": "No message history found for this course"}), 200
 
-        message_history = [{"question": qa.question_text, "answer":qa.answer_text, "sources":qa.sources} for qa in questions_and_answers]
+        message_history = [serialize(qa) for qa in questions_and_answers]
 
-        return jsonify({"message_history": message_history})
+        return jsonify({
+            "message_history": message_history,
+            "has_more": has_more,
+            "before": encode_cursor(questions_and_answers[0]) if questions_and_answers else before,
+            "after": encode_cursor(questions_and_answers[-1]) if questions_and_answers else after
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -52,6 +88,7 @@ def delete_message_history(course_code):
     try:
         # Delete all questions for the authenticated user and specified course
         Question.query.filter_by(user_id=user_id, course_code=course_code).delete()
+        clear_context(user_id, course_code)
         db.session.commit()
         return jsonify({"message": "Message history deleted successfully"}), 200
     except Exception as e:
@@ -59,18 +96,10 @@ def delete_message_history(course_code):
         return jsonify({"error": str(e)}), 500
 
 # Custom rate limit exceeded handler
-@limiter.request_filter
-def rate_limit_exceeded():
+@main.app_errorhandler(429)
+def rate_limit_exceeded(e):
     return jsonify({"error": "Rate limit exceeded. Please try again later."}), 429
 
-def sanitize_input(text: str) -> str:
-    # Remove potentially harmful HTML tags and attributes
-    sanitized_text = escape(text)
-    # Further remove any non-alphanumeric characters, except spaces
-    sanitized_text = re.sub(r'[^\w\s]', '', sanitized_text)
-    return sanitized_text.strip()
-
-
 @main.route('/ask/<course_code>', methods=['POST'])
 @jwt_required()
 @limiter.limit("5 per minute", key_func=get_jwt_identity)
@@ -82,41 +111,59 @@ def ask(course_code):
     user_id = get_jwt_identity()
 
     # Check if the user is enrolled in the course
-    enrollment = db.session.query(user_courses).filter_by(user_id=user_id, course_code=course_code).first()
-    if not enrollment:
+    if not enrollment_cache.is_enrolled(user_id, course_code):
         return jsonify({"error": "User not enrolled in the course"}), 403
 
-    rag_service_url = get_rag_service_url(course_code)
-    if not rag_service_url:
+    rag_client = get_rag_client(course_code)
+    if not rag_client:
         return jsonify({"error": "Invalid course_code"}), 400
 
     question_text = data['question']
+    stream = bool(data.get('stream'))
 
     try:
-        # Retrieve all questions and answers for the specific course
-        questions_and_answers = db.session.query(Question).filter_by(user_id=user_id, course_code=course_code).order_by(Question.created_at).all()
-        message_history = [{"question": sanitize_input(qa.question_text), "answer":sanitize_input(qa.answer_text)} for qa in questions_and_answers]
+        # Recent turns and the summary of older ones are kept already sanitized
+        context = get_context(user_id, course_code)
 
         # Call the rag_service API
-        response = requests.post(
-            f"{rag_service_url}/ask",
-            json={"question": sanitize_input(question_text), "message_history": message_history}
+        response = rag_client.post(
+            f"/ask/{course_code}",
+            {"question": sanitize_input(question_text), **context_payload(context), "stream": stream},
+            stream=stream
         )
 
         if response.status_code != 200:
+            response.close()
             return jsonify({"error": "Failed to get answer from RAG service"}), response.status_code
 
+        if stream:
+            return Response(
+                stream_with_context(relay_answer(response, context, user_id, course_code, question_text)),
+                mimetype='text/event-stream',
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
         answer_text = response.json().get("answer")
         sources = response.json().get("sources")
 
-        source_and_score = []
+        save_answer(context, user_id, course_code, question_text, answer_text, sources)
 
-        for source in sources:
-            source_and_score.append({
-                "source": source["source"],
-                "score": source["score"]
-            })
+        return jsonify({"answer": answer_text, "sources": sources})
+    except RagServiceUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def save_answer(context, user_id, course_code, question_text, answer_text, sources):
+    source_and_score = []
 
+    for source in sources:
+        source_and_score.append({
+            "source": source["source"],
+            "score": source["score"]
+        })
+
+    for attempt in range(2):
         # Save the question and answer to the database
         question = Question(
             user_id=user_id,
@@ -126,8 +173,37 @@ def ask(course_code):
             sources=source_and_score
         )
         db.session.add(question)
-        db.session.commit()
-
-        return jsonify({"answer": answer_text, "sources": sources})
+        append_turn(context, question_text, answer_text)
+        try:
+            db.session.commit()
+            return
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+            # A concurrent first question created the context meanwhile, so the turn goes onto that one
+            context = get_context(user_id, course_code)
+
+def relay_answer(response, context, user_id, course_code, question_text):
+    """Forward the RAG service's events as they arrive and save the turn once the answer is complete."""
+    sources = []
+    try:
+        for event, data in iter_sse_events(response):
+            if event == "sources":
+                sources = data.get("sources", [])
+            elif event == "done":
+                save_answer(context, user_id, course_code, question_text, data.get("answer"), sources)
+            yield format_sse(event, data)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        db.session.rollback()
+        yield format_sse("error", {"detail": str(e)})
+    finally:
+        response.close()
+
+@main.route('/rag-status', methods=['GET'])
+def rag_status():
+    # Monitoring is restricted to the same key as the course population endpoint
+    if request.headers.get('Authorization') != f"Bearer {os.getenv('VALID_API_KEY')}":
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify({"rag_services": rag_client_stats()}), 200
@@ -16,9 +16,13 @@ class Question(db.Model):
     question_text = db.Column(db.Text, nullable=False)
     answer_text = db.Column(db.Text, nullable=True)
     sources = db.Column(db.JSON, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     user = db.relationship('User', backref=db.backref('questions', lazy=True))
     course = db.relationship('Course', backref=db.backref('questions', lazy=True))
+    __table_args__ = (
+        # Serves history pages without scanning or sorting a user's whole history
+        db.Index('ix_question_user_course_created', 'user_id', 'course_code', 'created_at'),
+    )
 
 class Course(db.Model):
     code = db.Column(db.String(10), primary_key=True)
@@ -31,6 +35,18 @@ user_courses = db.Table('user_courses',
     db.Column('course_code', db.String(100), db.ForeignKey('course.code'), primary_key=True)
 )
 
+class CatalogVersion(db.Model):
+    # A single row, bumped whenever the course catalog changes so every worker notices
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class ConversationContext(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    course_code = db.Column(db.String(100), db.ForeignKey('course.code'), primary_key=True)
+    recent_turns = db.Column(db.JSON, nullable=False, default=list)
+    summary = db.Column(db.Text, nullable=False, default='')
+    turn_count = db.Column(db.Integer, nullable=False, default=0)
+
 class TokenBlocklist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), nullable=False, index=True)
@@ -0,0 +1,52 @@
+from api_service import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import os
+import threading
+
+# Hashes computed at once; bcrypt releases the GIL, so these use separate cores
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Hashes running or waiting before new logins are turned away
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 16))
+# Longest a request waits for its hash, in seconds
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs bcrypt on a small bounded pool so a burst of logins cannot take over every worker."""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING, timeout=PASSWORD_HASH_TIMEOUT):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def hash(self, password: str) -> str:
+        return self._run(bcrypt.generate_password_hash, password, self.rounds()).decode('utf-8')
+
+    def check(self, password_hash: str, password: str) -> bool:
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        # Hashes look like $2b$12$..., where 12 is the log2 work factor
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds()
+        except (IndexError, ValueError):
+            return True
+
+    @staticmethod
+    def rounds() -> int:
+        # Read in the request's thread, since the hashing threads have no app context
+        return current_app.config["BCRYPT_LOG_ROUNDS"]
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Too many logins in progress. Please try again shortly.")
+
+        future = self._executor.submit(function, *args)
+        # The slot stays taken until the hash finishes, even if the caller stops waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+password_hasher = PasswordHasher()
@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 import json
 import os
 from .models import Course
+from .catalog import catalog_snapshot
 from api_service import db
 
 VALID_API_KEY = os.getenv('VALID_API_KEY')
@@ -27,6 +28,7 @@ def update_courses():
                 else:
                     course = Course(code=course_data['code'], name=course_data['name'], description=course_data['description'])
                     db.session.add(course)
+            catalog_snapshot.invalidate()
             db.session.commit()
 
             return jsonify({"message": "Courses populated successfully"}), 200
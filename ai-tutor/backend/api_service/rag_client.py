@@ -0,0 +1,208 @@
+from requests.adapters import HTTPAdapter
+import json
+import os
+import random
+import threading
+import time
+import requests
+
+# Timeouts in seconds; the deadline bounds all attempts of one call together
+RAG_CONNECT_TIMEOUT = float(os.getenv("RAG_CONNECT_TIMEOUT", 3))
+RAG_READ_TIMEOUT = float(os.getenv("RAG_READ_TIMEOUT", 60))
+RAG_DEADLINE = float(os.getenv("RAG_DEADLINE", 75))
+# Retries after the first attempt, with full-jitter exponential backoff
+RAG_MAX_RETRIES = int(os.getenv("RAG_MAX_RETRIES", 2))
+RAG_RETRY_BACKOFF = float(os.getenv("RAG_RETRY_BACKOFF", 0.25))
+# Keep-alive connections kept per course
+RAG_POOL_SIZE = int(os.getenv("RAG_POOL_SIZE", 4))
+# Consecutive failures that open the breaker, and how long it stays open
+RAG_BREAKER_FAILURES = int(os.getenv("RAG_BREAKER_FAILURES", 5))
+RAG_BREAKER_RESET = float(os.getenv("RAG_BREAKER_RESET", 30))
+
+# Responses that mean the service itself is unhealthy and the call can be retried
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+def get_rag_service_url(course_code):
+    return os.getenv(f"RAG_SERVICE_{course_code}_URL")
+
+class RagServiceUnavailable(Exception):
+    pass
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, letting one probe through once the reset time has passed."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=RAG_BREAKER_FAILURES, reset_timeout=RAG_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected, "retry_in": retry_in}
+
+class RagClient:
+    """Keep-alive HTTP client for one course's RAG service."""
+
+    def __init__(self, course_code, base_url):
+        self.course_code = course_code
+        self.base_url = base_url.rstrip('/')
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        # Retries are handled below so that they respect the deadline and the breaker
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RAG_POOL_SIZE, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._adapter = adapter
+
+    def post(self, path, payload, stream=False) -> requests.Response:
+        """POST to the RAG service, raising RagServiceUnavailable when it cannot answer in time.
+
+        Only failures that happen before the service starts working (connection
+        errors and 502/503/504) are retried; a read timeout is not, so a slow
+        generation is never run twice.
+        """
+        if not self.breaker.allow_request():
+            raise RagServiceUnavailable(f"RAG service for {self.course_code} is temporarily unavailable")
+
+        deadline = time.monotonic() + RAG_DEADLINE
+        last_error = None
+        try:
+            for attempt in range(RAG_MAX_RETRIES + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    response = self.session.post(
+                        f"{self.base_url}{path}",
+                        json=payload,
+                        stream=stream,
+                        timeout=(min(RAG_CONNECT_TIMEOUT, remaining), min(RAG_READ_TIMEOUT, remaining))
+                    )
+                except requests.exceptions.ReadTimeout as e:
+                    last_error = e
+                    break
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    last_error = e
+                except requests.exceptions.RequestException as e:
+                    # e.g. the connection dropped mid-response, after the service started working
+                    last_error = e
+                    break
+                else:
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        self.breaker.record_success()
+                        return response
+                    last_error = f"status {response.status_code}"
+                    response.close()
+
+                if attempt < RAG_MAX_RETRIES:
+                    backoff = random.uniform(0, RAG_RETRY_BACKOFF * 2 ** attempt)
+                    time.sleep(min(backoff, max(0.0, deadline - time.monotonic())))
+        except BaseException:
+            # Whatever went wrong, the breaker must record an outcome or a half-open probe never finishes
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_failure()
+        raise RagServiceUnavailable(f"RAG service for {self.course_code} did not respond: {last_error}")
+
+    def stats(self) -> dict:
+        pools = []
+        for key in list(self._adapter.poolmanager.pools.keys()):
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": f"{pool.host}:{pool.port}",
+                "maxsize": pool.pool.maxsize if pool.pool is not None else RAG_POOL_SIZE,
+                "connections_created": pool.num_connections,
+                "requests": pool.num_requests
+            })
+        return {"url": self.base_url, "breaker": self.breaker.snapshot(), "pools": pools}
+
+def format_sse(event, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a streamed text/event-stream response."""
+    event, data_lines = "message", []
+    for raw_line in response.iter_lines():
+        line = raw_line.decode('utf-8')
+        if line:
+            field, _, value = line.partition(':')
+            if field == 'event':
+                event = value.strip()
+            elif field == 'data':
+                data_lines.append(value[1:] if value.startswith(' ') else value)
+            continue
+
+        # A blank line ends the event
+        if data_lines:
+            yield event, json.loads("\n".join(data_lines))
+        event, data_lines = "message", []
+
+    if data_lines:
+        yield event, json.loads("\n".join(data_lines))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_rag_client(course_code):
+    """Return the shared client for a course, or None if it has no RAG service."""
+    base_url = get_rag_service_url(course_code)
+    if not base_url:
+        return None
+
+    with _clients_lock:
+        client = _clients.get(course_code)
+        if client is None or client.base_url != base_url.rstrip('/'):
+            client = RagClient(course_code, base_url)
+            _clients[course_code] = client
+        return client
+
+def rag_client_stats() -> dict:
+    with _clients_lock:
+        clients = dict(_clients)
+    return {course_code: client.stats() for course_code, client in clients.items()}
@@ -0,0 +1,190 @@
+from limits.storage import Storage, SlidingWindowCounterSupport
+from urllib.parse import urlparse, parse_qs
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+# key hash, expires at, window number, current count, previous count
+SLOT = struct.Struct('<Qdqqq')
+# Slots sharing one lock; a key only ever lives in its own stripe
+STRIPE_SLOTS = 64
+
+class SharedMemoryStorage(Storage, SlidingWindowCounterSupport):
+    """Rate limit counters in a memory-mapped file shared by every worker on the host.
+
+    Configured as ``shm:///dev/shm/ai-tutor-ratelimit?slots=65536``. The file is a
+    fixed table of counters, so memory use does not grow with the number of
+    clients; when a stripe is full of live counters the one closest to expiring
+    is reused. Each update takes a byte-range lock on its stripe for the few
+    microseconds it needs, instead of a database transaction.
+
+    For limits that must hold across several hosts, point RATELIMIT_STORAGE_URI
+    at a Redis-compatible store (``redis://...``) instead; Flask-Limiter
+    supports it natively.
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        parsed = urlparse(uri)
+        self.path = parsed.path
+        slots = int(parse_qs(parsed.query).get('slots', [options.get('slots', 65536)])[0])
+        self.stripes = max(1, math.ceil(slots / STRIPE_SLOTS))
+        self.size = self.stripes * STRIPE_SLOTS * SLOT.size
+        # POSIX record locks do not exclude threads of the same process
+        self._thread_lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    def _map(self):
+        # Workers are forked after the app is created, so each process maps the file itself
+        if self._pid != os.getpid():
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self._fd = fd
+            self._mmap = mmap.mmap(fd, self.size)
+            self._pid = os.getpid()
+        return self._mmap
+
+    def _locate(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        # Zero marks an empty slot, so it is never used as a key hash
+        key_hash = int.from_bytes(digest, 'little') or 1
+        return key_hash, key_hash % self.stripes
+
+    def _update(self, key: str, change):
+        """Apply `change` to the key's slot under the stripe lock and return its result.
+
+        `change` gets a mutable list [expires_at, window, count, previous], all
+        zeros if the key has no live slot, and the current time. The list is
+        written back afterwards; a slot whose counts drop to zero is freed.
+        """
+        memory = self._map()
+        key_hash, stripe = self._locate(key)
+        start = stripe * STRIPE_SLOTS * SLOT.size
+        now = time.time()
+
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, STRIPE_SLOTS * SLOT.size, start)
+            try:
+                found, fields = None, [0.0, 0, 0, 0]
+                reusable, reusable_expiry = None, math.inf
+                for index in range(STRIPE_SLOTS):
+                    offset = start + index * SLOT.size
+                    slot_hash, expires_at, window, count, previous = SLOT.unpack_from(memory, offset)
+                    if slot_hash == key_hash:
+                        found = offset
+                        if expires_at > now:
+                            fields = [expires_at, window, count, previous]
+                        break
+                    if slot_hash == 0 or expires_at <= now:
+                        if reusable_expiry > 0:
+                            reusable, reusable_expiry = offset, 0
+                    elif expires_at < reusable_expiry:
+                        reusable, reusable_expiry = offset, expires_at
+
+                result = change(fields, now)
+                if fields[2] > 0 or fields[3] > 0:
+                    SLOT.pack_into(memory, found if found is not None else reusable, key_hash, *fields)
+                elif found is not None:
+                    SLOT.pack_into(memory, found, 0, 0.0, 0, 0, 0)
+                return result
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, STRIPE_SLOTS * SLOT.size, start)
+
+    def _read(self, key: str):
+        return self._update(key, lambda slot, now: list(slot))
+
+    # Fixed window counters
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        def change(slot, now):
+            if slot[2] == 0:
+                slot[0] = now + expiry
+            slot[2] += amount
+            return slot[2]
+        return self._update(key, change)
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        def change(slot, now):
+            slot[2] = max(0, slot[2] - amount)
+            return slot[2]
+        return self._update(key, change)
+
+    def get(self, key: str) -> int:
+        return self._read(key)[2]
+
+    def get_expiry(self, key: str) -> float:
+        expires_at = self._read(key)[0]
+        return expires_at or time.time()
+
+    def clear(self, key: str) -> None:
+        def change(slot, now):
+            slot[2] = slot[3] = 0
+        self._update(key, change)
+
+    def check(self) -> bool:
+        try:
+            self._map()
+            return True
+        except OSError:
+            return False
+
+    def reset(self) -> int | None:
+        memory = self._map()
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                used = sum(1 for offset in range(0, self.size, SLOT.size) if SLOT.unpack_from(memory, offset)[0])
+                memory[:] = bytes(self.size)
+                return used
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    # Sliding window counter: both windows live in one slot, so checks and hits are atomic
+
+    def _roll(self, slot, now, expiry):
+        window = int(now // expiry)
+        if slot[1] != window:
+            slot[3] = slot[2] if slot[1] == window - 1 else 0
+            slot[2] = 0
+            slot[1] = window
+        # Counts matter until the current window has itself become the previous one
+        slot[0] = (window + 2) * expiry
+
+    def _window_info(self, slot, now, expiry):
+        elapsed = now % expiry
+        previous_ttl = expiry - elapsed if slot[3] else 0.0
+        return slot[3], previous_ttl, slot[2], 2 * expiry - elapsed
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+
+        def change(slot, now):
+            self._roll(slot, now, expiry)
+            previous, previous_ttl, current, _ = self._window_info(slot, now, expiry)
+            if math.floor(previous * previous_ttl / expiry + current) + amount > limit:
+                return False
+            slot[2] += amount
+            return True
+        return self._update(key, change)
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        def change(slot, now):
+            self._roll(slot, now, expiry)
+            return self._window_info(slot, now, expiry)
+        return self._update(key, change)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        self.clear(key)
@@ -0,0 +1,89 @@
+from .models import TokenBlocklist
+from api_service import db, ACCESS_EXPIRES
+from datetime import datetime, timezone
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often each worker picks up tokens revoked by the other workers
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 5))
+# How often each worker deletes blocklist rows for tokens that have expired anyway, in the background; 0 leaves it to `flask auth purge-blocklist`
+BLOCKLIST_PURGE_SECONDS = float(os.getenv("BLOCKLIST_PURGE_SECONDS", 3600))
+
+def _expiry(revoked_at: datetime) -> float:
+    # A revoked token was issued before it was revoked, so it cannot outlive this
+    if revoked_at.tzinfo is None:
+        revoked_at = revoked_at.replace(tzinfo=timezone.utc)
+    return (revoked_at + ACCESS_EXPIRES).timestamp()
+
+def _cutoff() -> datetime:
+    # Rows older than this belong to tokens that have expired anyway
+    return (datetime.now(timezone.utc) - ACCESS_EXPIRES).replace(tzinfo=None)
+
+class RevocationCache:
+    """In-memory set of revoked token ids, kept in step with the TokenBlocklist table.
+
+    Checks are a dictionary lookup. At most every REVOCATION_SYNC_SECONDS the
+    rows of tokens that can still be valid are read again, so a token revoked
+    through another worker is rejected here within that interval; revocations
+    through this worker apply immediately. Rows are not tracked by id, since
+    SQLite reuses the ids of purged rows.
+    """
+
+    def __init__(self, sync_interval=REVOCATION_SYNC_SECONDS):
+        self.sync_interval = sync_interval
+        self._revoked = {}
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti: str) -> bool:
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoke(self, jti: str, revoked_at: datetime):
+        with self._lock:
+            self._revoked[jti] = _expiry(revoked_at)
+
+    def sync(self):
+        rows = db.session.query(TokenBlocklist.jti, TokenBlocklist.created_at)\
+            .filter(TokenBlocklist.created_at >= _cutoff()).all()
+        with self._lock:
+            now = time.time()
+            revoked = {jti: _expiry(created_at) for jti, created_at in rows}
+            # Keep revocations made here, whatever the read above could see
+            for jti, expires_at in self._revoked.items():
+                revoked.setdefault(jti, expires_at)
+            self._revoked = {jti: expires_at for jti, expires_at in revoked.items() if expires_at > now}
+            self._next_sync = time.monotonic() + self.sync_interval
+
+def purge_expired_tokens() -> int:
+    """Delete blocklist rows whose tokens have expired, returning how many were removed."""
+    # Own transaction, so it never commits anything pending on the request's session
+    with db.engine.begin() as connection:
+        result = connection.execute(TokenBlocklist.__table__.delete().where(TokenBlocklist.created_at < _cutoff()))
+    return result.rowcount
+
+def start_blocklist_purger(app, interval=BLOCKLIST_PURGE_SECONDS):
+    """Purge expired blocklist rows every `interval` seconds on a background thread; 0 disables it."""
+    if interval <= 0:
+        return None
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            # Best effort: a busy database is tried again on the next round
+            try:
+                with app.app_context():
+                    purge_expired_tokens()
+            except Exception as e:
+                logger.warning(f"Blocklist purge failed: {e}")
+
+    threading.Thread(target=run, name="blocklist-purger", daemon=True).start()
+    return stopped
+
+revocation_cache = RevocationCache()
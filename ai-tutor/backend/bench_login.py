@@ -0,0 +1,46 @@
+"""Micro-benchmark for password verification throughput.
+
+Run from the backend directory:
+
+    python bench_login.py [--rounds 12] [--logins 64]
+
+Verifies the same password repeatedly through the bounded hashing pool and
+reports logins per second overall and per pool worker (one worker per core).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_LOG_ROUNDS", 12)))
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_LOG_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.logins)
+
+    from api_service import create_app
+    from api_service.passwords import PasswordHasher
+
+    app = create_app()
+    with app.app_context():
+        hasher = PasswordHasher()
+        password_hash = hasher.hash("password123")
+
+        # Simulate concurrent login requests all waiting on the pool
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.logins) as requests:
+            results = list(requests.map(lambda _: hasher.check(password_hash, "password123"), range(args.logins)))
+        elapsed = time.perf_counter() - start
+
+    assert all(results)
+    per_second = args.logins / elapsed
+    print(f"cost={args.rounds} workers={args.workers} logins={args.logins} elapsed={elapsed:.2f}s")
+    print(f"{per_second:.1f} logins/s, {per_second / args.workers:.1f} logins/s per core")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""add composite index for paginated message history
+
+Revision ID: 3f1c2a7d9b10
+Revises: 
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in create_app may already have built it for fresh databases
+    op.create_index('ix_question_user_course_created', 'question', ['user_id', 'course_code', 'created_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_question_user_course_created', table_name='question', if_exists=True)
@@ -0,0 +1,35 @@
+"""add conversation context table
+
+Revision ID: 8b2e4d6f1a37
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 18:04:12.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6f1a37'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in create_app may already have built it for fresh databases
+    op.create_table('conversation_context',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('course_code', sa.String(length=100), nullable=False),
+        sa.Column('recent_turns', sa.JSON(), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('turn_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['course_code'], ['course.code'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'course_code'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('conversation_context', if_exists=True)
@@ -0,0 +1,30 @@
+"""add catalog version table
+
+Revision ID: c4a9e1f27b58
+Revises: 8b2e4d6f1a37
+Create Date: 2026-10-18 19:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e1f27b58'
+down_revision = '8b2e4d6f1a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in create_app may already have built it for fresh databases
+    op.create_table('catalog_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('catalog_version', if_exists=True)
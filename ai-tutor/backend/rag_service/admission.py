@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from batching import Histogram
+import asyncio
+import contextlib
+import functools
+import os
+import time
+
+# Questions answered at once, and how many more may wait for a worker before new ones are turned away
+RAG_WORKERS = int(os.getenv("RAG_WORKERS", 8))
+RAG_QUEUE_SIZE = int(os.getenv("RAG_QUEUE_SIZE", 32))
+# Seconds a rejected client is told to wait before trying again
+RAG_RETRY_AFTER = int(os.getenv("RAG_RETRY_AFTER", 5))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionController:
+    """Runs the blocking retrieval and generation pipeline on a bounded worker pool.
+
+    At most `workers` questions run at once and at most `queue_size` wait for
+    a worker; anything beyond that is rejected immediately with Overloaded
+    rather than piling up. All bookkeeping happens on the event loop thread.
+    """
+
+    def __init__(self, workers=RAG_WORKERS, queue_size=RAG_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-worker")
+        self.waiting = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_ms = Histogram([1, 5, 10, 50, 100, 500, 1000, 5000, 10000])
+        self._slots = asyncio.Semaphore(workers)
+
+    def has_capacity(self) -> bool:
+        return self.active < self.workers or self.waiting < self.queue_size
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn` on a worker and return its result, raising Overloaded if the queue is full."""
+        async with self._slot():
+            return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def admit(self):
+        """Wait for a worker slot, raising Overloaded if the queue is full.
+
+        Returns the function that gives the slot back; calling it more than
+        once is harmless, so every way a response can end may call it.
+        """
+        self.check_capacity()
+        enqueued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.wait_ms.observe((time.perf_counter() - enqueued) * 1000)
+        self.admitted += 1
+        self.active += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.active -= 1
+                self._slots.release()
+
+        return release
+
+    async def stream(self, iterator, release):
+        """Drain a blocking iterator on a worker, giving back the slot taken by `admit` when it ends.
+
+        The slot is taken before the response starts, since a rejection can no
+        longer change the status code once streaming begins.
+        """
+        loop = asyncio.get_running_loop()
+        done = object()
+        try:
+            while True:
+                item = await loop.run_in_executor(self.executor, next, iterator, done)
+                if item is done:
+                    return
+                yield item
+        finally:
+            release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_ms": self.wait_ms.snapshot()
+        }
+
+    def check_capacity(self):
+        """Raise Overloaded, counting the rejection, if a new question would exceed the queue."""
+        if not self.has_capacity():
+            self.rejected += 1
+            raise Overloaded(f"RAG service is busy: {self.active} questions running and {self.waiting} waiting")
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        release = await self.admit()
+        try:
+            yield
+        finally:
+            release()
@@ -1,33 +1,51 @@
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from neo4j import GraphDatabase
-from neo4j_graphrag.retrievers import HybridRetriever
+from typing import Literal, Optional
 from neo4j_graphrag.llm import OpenAILLM
-from neo4j_graphrag.generation import GraphRAG
-from neo4j_graphrag.types import LLMMessage
 from neo4j_graphrag.embeddings.base import Embedder
-from sentence_transformers import SentenceTransformer
+from embedding_backends import EMBEDDING_PRELOAD, BackgroundModel
+from embedding_cache import EmbeddingCache
+from batching import MicroBatcher
+from admission import RAG_RETRY_AFTER, AdmissionController, Overloaded
+from semantic_cache import REWRITE_ANSWER_CHARS, REWRITE_TURNS, SEMANTIC_CACHE_FOLLOW_UPS, SemanticAnswerCache
+from retrieval_cache import RetrievalCache
+from courses import RAG_PRELOAD_COURSES, CourseRegistry
+from context_packing import TokenCounter, pack_context
+from sources import SOURCE_TEXT_CHARS, format_sources, source_records
+import json
 import os
 
 app = FastAPI()
 
-# Neo4j connection details
-URI = os.getenv("NEO4J_URI")
-AUTH = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
-
-# Initialize the Neo4j driver
-driver = GraphDatabase.driver(URI, auth=AUTH)
-
 # Initialize the LLM
 llm = OpenAILLM(model_name="gpt-4o", model_params={"temperature": 0})
+token_counter = TokenCounter(llm.model_name)
 
 # Define a custom embedder class
 class CustomEmbedder(Embedder):
     def __init__(self, model_name):
-        self.model = SentenceTransformer(model_name)
+        self.model = BackgroundModel(model_name)
+        if EMBEDDING_PRELOAD:
+            self.model.start()
+        # Backends differ slightly in their output, so each keeps its own cached vectors
+        self.cache = EmbeddingCache(f"{model_name}@{self.model.backend}")
+        # Concurrent cache misses share one forward pass
+        self.batcher = MicroBatcher(self._encode_batch)
 
     def embed_query(self, text):
-        texts = list(map(lambda x: x.replace("\n", " "), [text]))
+        # Students repeat the same questions, so most of these skip the model entirely
+        cached = self.cache.get(text)
+        if cached is not None:
+            return cached
+
+        embedding = self.batcher.embed(text)
+        self.cache.put(text, embedding)
+        return embedding
+
+    def _encode_batch(self, texts):
+        texts = list(map(lambda x: x.replace("\n", " "), texts))
         embeddings = self.model.encode(
             texts
         )
@@ -36,82 +54,217 @@ class CustomEmbedder(Embedder):
                 "Expected embeddings to be a Tensor or a numpy array, "
                 "got a list instead."
             )
-        return embeddings.tolist()[0]
+        return embeddings.tolist()
 
 # Set up the embedder
 embedder = CustomEmbedder('sentence-transformers/all-MiniLM-L6-v2')
 
 # embedder = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 
-# Index names
-INDEX_NAME = "vector"
-FULLTEXT_INDEX_NAME = "keyword"
-
-fields = [
-    "fileName",
-    "text",
-    "score"
-]
-
-# Initialize the retrievers
-# vector_retriever = VectorRetriever(driver, INDEX_NAME, embedder)
-hybrid_retriever = HybridRetriever(
-    driver,
-    vector_index_name=INDEX_NAME,
-    fulltext_index_name=FULLTEXT_INDEX_NAME,
-    embedder=embedder,
-    return_properties=fields
-)
-# text2cypher_retriever = Text2CypherRetriever(driver, llm)
+# One process serves every course; they share the embedder, LLM client and Neo4j drivers
+courses = CourseRegistry(embedder, llm)
+if RAG_PRELOAD_COURSES:
+    courses.preload()
 
-# Initialize the GraphRAG pipeline
-rag = GraphRAG(llm=llm, retriever=hybrid_retriever)
+# Answering blocks on the embedder, Neo4j and OpenAI, so it runs off the event loop
+admission = AdmissionController()
+
+# Reworded repeats of earlier questions reuse their answers
+answer_cache = SemanticAnswerCache()
+# Popular topics skip the Neo4j search even when their answers differ
+retrieval_cache = RetrievalCache()
 
 class QuestionRequest(BaseModel):
     question: str
     message_history: list
+    summary: str = ""
+    stream: bool = False
+    # Fields of each source to return, and the longest chunk text (0 for whole chunks)
+    source_fields: Optional[list[Literal["source", "chunk", "score"]]] = None
+    max_chunk_chars: Optional[int] = None
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def retrieve(course_code, question_text, retriever_config):
+    """Return the course's pipeline and the ranked items retrieved for the question."""
+    rag = courses.get(course_code)
+    query_vector = embedder.embed_query(question_text)
+    key = retrieval_cache.key(course_code, query_vector, question_text, retriever_config)
+    items = retrieval_cache.get(key, query_vector)
+    if items is None:
+        items = rag.retriever.search(query_text=question_text, query_vector=query_vector, **retriever_config).items
+        retrieval_cache.put(key, query_vector, items)
+    return rag, items
+
+def build_prompt(rag, question_text, items, turns, summary):
+    """Pack the retrieved chunks and conversation into the prompt budget and return the chat messages."""
+    packed = pack_context(items, turns, token_counter, summary=summary)
+    context = "\n".join(item.content for item in packed.items)
+    prompt = rag.prompt_template.format(query_text=question_text, context=context, examples="")
+    messages = llm.get_messages(prompt, packed.history, system_instruction=rag.prompt_template.system_instructions)
+    return messages, packed
+
+REWRITE_INSTRUCTIONS = (
+    "Rewrite the student's latest question so that it can be understood without the conversation. "
+    "Replace pronouns and references to earlier messages with what they refer to, keep the question's meaning "
+    "and language, and do not answer it. Reply with the rewritten question only."
+)
+
+def standalone_question(question_text, turns, summary):
+    """Rewrite a follow-up into a question that stands on its own, using the summary and the last few turns."""
+    lines = [summary] if summary else []
+    for turn in turns[-REWRITE_TURNS:]:
+        lines.append(f"Student: {turn['question']}")
+        lines.append(f"Tutor: {turn['answer'][:REWRITE_ANSWER_CHARS]}")
+    conversation = "\n".join(lines)
+    completion = llm.client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": REWRITE_INSTRUCTIONS},
+            {"role": "user", "content": f"Conversation:\n{conversation}\n\nLatest question: {question_text}"}
+        ],
+        model=llm.model_name,
+        temperature=0
+    )
+    return (completion.choices[0].message.content or "").strip() or question_text
+
+def cache_question(question_text, turns, summary):
+    """Return the question to retrieve and cache by, and its embedding, or None if the answer is not cached.
+
+    Follow-ups are rewritten into standalone questions, so the same follow-up
+    asked in different conversations shares one cache entry and retrieves by
+    what it actually asks about. The answer is still generated with the
+    conversation in the prompt.
+    """
+    if turns or summary:
+        if not SEMANTIC_CACHE_FOLLOW_UPS:
+            return question_text, None
+        question_text = standalone_question(question_text, turns, summary)
+    return question_text, embedder.embed_query(question_text)
+
+def answer_question(course_code, question_text, turns, summary, retriever_config, source_format):
+    question_text, query_vector = cache_question(question_text, turns, summary)
+    if query_vector is not None:
+        cached = answer_cache.lookup(course_code, query_vector)
+        if cached is not None:
+            return {"answer": cached["answer"], "sources": format_sources(cached["sources"], **source_format)}
+
+    rag, items = retrieve(course_code, question_text, retriever_config)
+    messages, packed = build_prompt(rag, question_text, items, turns, summary)
+    completion = llm.client.chat.completions.create(messages=messages, model=llm.model_name, **llm.model_params)
+    answer = completion.choices[0].message.content or ""
+
+    records = source_records(packed.items)
+    if query_vector is not None:
+        answer_cache.store(course_code, question_text, query_vector, answer, records)
+    return {"answer": answer, "sources": format_sources(records, **source_format)}
+
+def stream_answer(course_code, question_text, turns, summary, retriever_config, source_format):
+    """Answer like answer_question, streaming the answer as Server-Sent Events.
+
+    Sources are sent first, then one `token` event per generated delta, then a
+    `done` event carrying the full answer (or an `error` event). A cached
+    answer is sent as a single token.
+    """
+    try:
+        question_text, query_vector = cache_question(question_text, turns, summary)
+        if query_vector is not None:
+            cached = answer_cache.lookup(course_code, query_vector)
+            if cached is not None:
+                yield sse_event("sources", {"sources": format_sources(cached["sources"], **source_format)})
+                yield sse_event("token", {"token": cached["answer"]})
+                yield sse_event("done", {"answer": cached["answer"]})
+                return
+
+        rag, items = retrieve(course_code, question_text, retriever_config)
+        messages, packed = build_prompt(rag, question_text, items, turns, summary)
+        records = source_records(packed.items)
+        yield sse_event("sources", {"sources": format_sources(records, **source_format)})
+
+        completion = llm.client.chat.completions.create(
+            messages=messages,
+            model=llm.model_name,
+            stream=True,
+            **llm.model_params
+        )
+
+        answer_parts = []
+        for chunk in completion:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                answer_parts.append(token)
+                yield sse_event("token", {"token": token})
+
+        answer = "".join(answer_parts)
+        if query_vector is not None:
+            answer_cache.store(course_code, question_text, query_vector, answer, records)
+        yield sse_event("done", {"answer": answer})
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
 
 
 @app.post("/ask")
-async def ask(request: QuestionRequest):
+async def ask_default_course(request: QuestionRequest):
+    return await ask(courses.default_course, request)
+
+@app.post("/ask/{course_code}")
+async def ask(course_code: str, request: QuestionRequest):
+    course_code = course_code.upper()
+    if course_code not in courses.course_codes:
+        raise HTTPException(status_code=404, detail=f"Course {course_code} is not served here")
+
     question_text = request.question
-    history = request.message_history
+    turns = request.message_history
 
     # Sanitize the input query
     sanitized_question_text = question_text
 
-    message_history = []
-    for qa in history:
-        message_history.append(LLMMessage(role="user", content=qa["question"]))
-        message_history.append(LLMMessage(role="assistant", content=qa["answer"]))
-
     retriever_config = {"top_k": 5}
+    source_format = {
+        "fields": request.source_fields,
+        "max_chars": SOURCE_TEXT_CHARS if request.max_chunk_chars is None else request.max_chunk_chars
+    }
+
+    if request.stream:
+        try:
+            release = await admission.admit()
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RAG_RETRY_AFTER)})
+        return StreamingResponse(
+            admission.stream(stream_answer(course_code, question_text, turns, request.summary, retriever_config, source_format), release),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            # Also frees the slot if the client leaves before the stream is read
+            background=BackgroundTask(release)
+        )
+
     try:
-        response = rag.search(query_text=question_text, retriever_config=retriever_config, return_context=True)
-        answer_text = response.answer
-
-        # Extract sources and documents
-        results = response.retriever_result.items
-        output = []
-
-        for item in results:
-            content_dict = eval(item.content)
-            source = content_dict.get('fileName', 'Unknown')
-            chunk = content_dict.get('text', '')
-            score = item.metadata.get('score', None)
-
-            output.append({
-                'source': source,
-                'chunk': chunk,
-                'score': score
-            })
-
-        return {
-            "answer": answer_text,
-            "sources": output
-        }
+        return await admission.run(answer_question, course_code, question_text, turns, request.summary, retriever_config, source_format)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RAG_RETRY_AFTER)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats")
+async def stats():
+    return {"embedding_cache": embedder.cache.stats(), "embedding_batches": embedder.batcher.stats(),
+            "admission": admission.stats(), "answer_cache": answer_cache.stats(),
+            "retrieval_cache": retrieval_cache.stats(), "courses": courses.stats(),
+            "embedding_model": embedder.model.status()}
+
+@app.get("/ready")
+async def ready():
+    # Questions are accepted during a cold start but wait for the model; probes should wait too
+    status = embedder.model.status()
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+@app.delete("/cache/{course_code}")
+@app.delete("/answer-cache/{course_code}")
+async def invalidate_caches(course_code: str):
+    course_code = course_code.upper()
+    return {"invalidated": answer_cache.invalidate(course_code), "retrievals_invalidated": retrieval_cache.invalidate(course_code)}
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=6000)
\ No newline at end of file
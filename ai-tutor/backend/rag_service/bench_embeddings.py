@@ -0,0 +1,66 @@
+"""Compare embedding backends on cold start, throughput and agreement with the PyTorch model.
+
+Run from the rag_service directory:
+
+    python bench_embeddings.py [--backends torch onnx onnx-int8] [--texts questions.txt] [--batch-size 32]
+
+Cold start is the time to load the model and embed one text. The "torch"
+backend always loads first, as the reference, and also pays for importing
+the libraries. Agreement is the cosine similarity between each backend's
+embedding and the "torch" backend's embedding of the same text.
+"""
+from embedding_backends import BACKENDS, load_model
+import argparse
+import time
+import numpy as np
+
+SAMPLE_QUESTIONS = [
+    "What is the observer pattern?",
+    "How does dependency inversion differ from dependency injection?",
+    "When should I use an interface instead of an abstract class?",
+    "Explain the single responsibility principle with an example.",
+    "What does clean architecture say about the entities layer?",
+    "How do I write a JUnit test for a method that throws an exception?",
+    "What is the difference between composition and inheritance?",
+    "Why are getters and setters sometimes considered a code smell?",
+]
+
+def unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--texts")
+    parser.add_argument("--repeat", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.texts:
+        with open(args.texts) as file:
+            texts = [line.strip() for line in file if line.strip()]
+    else:
+        texts = SAMPLE_QUESTIONS * args.repeat
+
+    reference = None
+    for backend in ["torch"] + [backend for backend in args.backends if backend != "torch"]:
+        start = time.perf_counter()
+        model = load_model(args.model, backend)
+        model.encode(texts[:1])
+        cold_start = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = unit(model.encode(texts, batch_size=args.batch_size))
+        per_second = len(texts) / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = vectors
+        agreement = np.sum(vectors * reference, axis=1)
+        if backend in args.backends:
+            print(f"{backend:<11} cold_start={cold_start:.2f}s {per_second:.0f} embeddings/s "
+                  f"cosine mean={agreement.mean():.4f} min={agreement.min():.4f}")
+
+if __name__ == '__main__':
+    main()
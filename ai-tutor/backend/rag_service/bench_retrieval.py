@@ -0,0 +1,77 @@
+"""Benchmark the local snapshot retriever against Neo4j's vector index.
+
+Run from the rag_service directory after exporting a snapshot:
+
+    python bench_retrieval.py CSC207 [--questions questions.txt] [--queries 200] [--nprobe 8]
+
+Questions are read one per line, or sampled from the snapshot's chunk texts.
+Recall@k is measured for both paths against an exact brute-force search over
+the snapshot; latency covers the search only, with the query already embedded.
+"""
+from courses import course_setting
+from local_index import LOCAL_INDEX_DIR, LOCAL_INDEX_NPROBE, LocalSnapshot
+from sentence_transformers import SentenceTransformer
+import argparse
+import os
+import random
+import time
+import neo4j
+import numpy as np
+
+def percentiles(samples):
+    milliseconds = np.array(samples) * 1000
+    return f"p50={np.percentile(milliseconds, 50):.2f}ms p95={np.percentile(milliseconds, 95):.2f}ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("course_code")
+    parser.add_argument("--questions")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=LOCAL_INDEX_NPROBE)
+    args = parser.parse_args()
+
+    course_code = args.course_code.upper()
+    snapshot = LocalSnapshot(course_setting(course_code, "LOCAL_INDEX_DIR", os.path.join(LOCAL_INDEX_DIR, course_code)))
+    if args.questions:
+        with open(args.questions) as file:
+            questions = [line.strip() for line in file if line.strip()][:args.queries]
+    else:
+        rows = random.Random(0).sample(range(len(snapshot)), min(args.queries, len(snapshot)))
+        questions = [" ".join(snapshot.record(row)["node"]["text"].split()[:20]) for row in rows]
+
+    model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    vectors = model.encode(questions)
+    ids = [snapshot.record(row)["id"] for row in range(len(snapshot))]
+
+    driver = neo4j.GraphDatabase.driver(
+        course_setting(course_code, "NEO4J_URI"),
+        auth=(course_setting(course_code, "NEO4J_USERNAME"), course_setting(course_code, "NEO4J_PASSWORD"))
+    )
+    index_name = course_setting(course_code, "VECTOR_INDEX", "vector")
+    local_hits = neo4j_hits = 0
+    local_latency, neo4j_latency = [], []
+    with driver:
+        for vector in vectors:
+            expected = {ids[row] for row, _ in snapshot.exact_search(vector, args.top_k)}
+
+            start = time.perf_counter()
+            found = snapshot.search(vector, args.top_k, args.nprobe)
+            local_latency.append(time.perf_counter() - start)
+            local_hits += len(expected & {ids[row] for row, _ in found})
+
+            start = time.perf_counter()
+            records = driver.execute_query(
+                "CALL db.index.vector.queryNodes($index, $k, $vector) YIELD node RETURN elementId(node) AS id",
+                {"index": index_name, "k": args.top_k, "vector": vector.tolist()}
+            ).records
+            neo4j_latency.append(time.perf_counter() - start)
+            neo4j_hits += len(expected & {record["id"] for record in records})
+
+    total = len(vectors) * args.top_k
+    print(f"chunks={len(snapshot)} lists={snapshot.meta['lists']} nprobe={args.nprobe} queries={len(vectors)}")
+    print(f"local  recall@{args.top_k}={local_hits / total:.3f} {percentiles(local_latency)}")
+    print(f"neo4j  recall@{args.top_k}={neo4j_hits / total:.3f} {percentiles(neo4j_latency)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from neo4j_graphrag.types import LLMMessage, RetrieverResultItem
+import os
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens of retrieved chunks and conversation history allowed in one prompt
+RAG_PROMPT_BUDGET = int(os.getenv("RAG_PROMPT_BUDGET", 6000))
+# Share of the budget history may take before chunks are packed
+RAG_HISTORY_SHARE = float(os.getenv("RAG_HISTORY_SHARE", 0.3))
+# A chunk is only cut to fit if at least this many of its tokens still fit
+MIN_TRUNCATED_TOKENS = 64
+
+
+class TokenCounter:
+    """Counts tokens with the model's tiktoken encoding, or estimates them if tiktoken is missing."""
+
+    def __init__(self, model_name):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def count(self, text) -> int:
+        if self.encoding is None:
+            # Roughly four characters per token for English text
+            return len(text) // 4 + 1
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens) -> str:
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+@dataclass
+class PackedContext:
+    items: list = field(default_factory=list)
+    history: list = field(default_factory=list)
+    tokens: int = 0
+    dropped_items: int = 0
+    dropped_turns: int = 0
+
+
+def pack_context(items, turns, counter, summary="", budget=RAG_PROMPT_BUDGET, history_share=RAG_HISTORY_SHARE):
+    """Fit retrieved `items` and recent conversation `turns` into `budget` tokens.
+
+    The summary always goes in. Turns are taken newest first, up to
+    `history_share` of the budget, and returned in chronological order as
+    LLMMessages. Chunks fill what is left in order of score; the first one
+    that does not fit is truncated if a useful part of it fits, and the
+    rest are dropped.
+    """
+    packed = PackedContext()
+    if summary:
+        packed.history.append(LLMMessage(role="system", content=f"Earlier in this conversation (each question with the start of its answer):\n{summary}"))
+        packed.tokens += counter.count(summary)
+
+    history_budget = int(budget * history_share)
+    recent = []
+    for turn in reversed(turns):
+        tokens = counter.count(turn["question"]) + counter.count(turn["answer"])
+        if packed.tokens + tokens > history_budget:
+            break
+        recent.append(turn)
+        packed.tokens += tokens
+    packed.dropped_turns = len(turns) - len(recent)
+    for turn in reversed(recent):
+        packed.history.append(LLMMessage(role="user", content=turn["question"]))
+        packed.history.append(LLMMessage(role="assistant", content=turn["answer"]))
+
+    ranked = sorted(items, key=lambda item: (item.metadata or {}).get("score") or 0.0, reverse=True)
+    for item in ranked:
+        remaining = budget - packed.tokens
+        tokens = counter.count(item.content)
+        if tokens <= remaining:
+            packed.items.append(item)
+            packed.tokens += tokens
+        elif remaining >= MIN_TRUNCATED_TOKENS:
+            packed.items.append(RetrieverResultItem(content=counter.truncate(item.content, remaining), metadata=item.metadata))
+            packed.tokens += remaining
+        else:
+            break
+    packed.dropped_items = len(items) - len(packed.items)
+    return packed
@@ -0,0 +1,108 @@
+from neo4j import GraphDatabase
+from neo4j_graphrag.retrievers import HybridRetriever
+from neo4j_graphrag.generation import GraphRAG
+from local_index import LOCAL_INDEX_DIR, LocalSnapshot, LocalVectorRetriever
+from sources import source_record_formatter
+import os
+import threading
+
+# Courses served by this process; the first also answers the course-less /ask
+RAG_COURSES = [code.strip().upper() for code in os.getenv("RAG_COURSES", os.getenv("COURSE_CODE", "CSC207")).split(",") if code.strip()]
+# Build every course's retriever at startup instead of on its first question
+RAG_PRELOAD_COURSES = os.getenv("RAG_PRELOAD_COURSES", "false").lower() == "true"
+
+RETURN_PROPERTIES = ["fileName", "text", "score"]
+
+
+class UnknownCourse(Exception):
+    pass
+
+
+def course_setting(course_code, name, default=None):
+    """A `{COURSE}_{NAME}` variable, falling back to the shared `{NAME}` and then `default`."""
+    return os.getenv(f"{course_code}_{name}") or os.getenv(name) or default
+
+
+class CourseRegistry:
+    """The GraphRAG pipeline of each configured course, built on first use.
+
+    Every course shares the embedder, the LLM client and one Neo4j driver (and
+    its connection pool) per database server, so a course only adds its
+    retriever. Each course is configured through `{COURSE}_NEO4J_URI`,
+    `{COURSE}_NEO4J_DATABASE`, `{COURSE}_VECTOR_INDEX`, `{COURSE}_FULLTEXT_INDEX`,
+    `{COURSE}_RAG_RETRIEVER` and `{COURSE}_LOCAL_INDEX_DIR`, each defaulting to
+    the variable without the prefix.
+    """
+
+    def __init__(self, embedder, llm, course_codes=RAG_COURSES):
+        self.embedder = embedder
+        self.llm = llm
+        self.course_codes = list(course_codes)
+        self._pipelines = {}
+        self._drivers = {}
+        self._drivers_lock = threading.Lock()
+        # Loading one course does not hold up questions for the others
+        self._load_locks = {code: threading.Lock() for code in self.course_codes}
+
+    @property
+    def default_course(self):
+        return self.course_codes[0]
+
+    def get(self, course_code) -> GraphRAG:
+        course_code = course_code.upper()
+        if course_code not in self._load_locks:
+            raise UnknownCourse(f"Course {course_code} is not served here")
+
+        rag = self._pipelines.get(course_code)
+        if rag is None:
+            with self._load_locks[course_code]:
+                rag = self._pipelines.get(course_code)
+                if rag is None:
+                    rag = self._pipelines[course_code] = self._load(course_code)
+        return rag
+
+    def preload(self):
+        for course_code in self.course_codes:
+            self.get(course_code)
+
+    def stats(self) -> dict:
+        return {"configured": self.course_codes, "loaded": sorted(self._pipelines), "drivers": len(self._drivers)}
+
+    def close(self):
+        with self._drivers_lock:
+            for driver in self._drivers.values():
+                driver.close()
+            self._drivers.clear()
+
+    def _driver(self, uri, username, password):
+        with self._drivers_lock:
+            driver = self._drivers.get((uri, username))
+            if driver is None:
+                driver = self._drivers[(uri, username)] = GraphDatabase.driver(uri, auth=(username, password))
+            return driver
+
+    def _load(self, course_code):
+        if course_setting(course_code, "RAG_RETRIEVER", "hybrid") == "local":
+            # "local" answers vector searches from a snapshot exported with `python local_index.py export`
+            directory = course_setting(course_code, "LOCAL_INDEX_DIR", os.path.join(LOCAL_INDEX_DIR, course_code))
+            try:
+                retriever = LocalVectorRetriever(LocalSnapshot(directory), self.embedder, result_formatter=source_record_formatter)
+                return GraphRAG(llm=self.llm, retriever=retriever)
+            except FileNotFoundError as e:
+                print(f"No local snapshot for {course_code} in {directory}, using the hybrid retriever: {e}")
+
+        driver = self._driver(
+            course_setting(course_code, "NEO4J_URI"),
+            course_setting(course_code, "NEO4J_USERNAME"),
+            course_setting(course_code, "NEO4J_PASSWORD")
+        )
+        retriever = HybridRetriever(
+            driver,
+            vector_index_name=course_setting(course_code, "VECTOR_INDEX", "vector"),
+            fulltext_index_name=course_setting(course_code, "FULLTEXT_INDEX", "keyword"),
+            embedder=self.embedder,
+            return_properties=RETURN_PROPERTIES,
+            result_formatter=source_record_formatter,
+            neo4j_database=course_setting(course_code, "NEO4J_DATABASE")
+        )
+        return GraphRAG(llm=self.llm, retriever=retriever)
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+# How the query embedding model runs: "torch", "torch-int8", "onnx" or "onnx-int8"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Quantized ONNX export shipped with the model; use the avx512_vnni or arm64 variant on hosts that support it
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx")
+# Load the model in the background at startup; otherwise it loads on the first query
+EMBEDDING_PRELOAD = os.getenv("EMBEDDING_PRELOAD", "true").lower() == "true"
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def load_model(model_name, backend):
+    """Load `model_name` as a SentenceTransformer running on `backend`."""
+    # Imported here so the service starts without waiting for PyTorch
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "torch-int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        # Linear layers dominate MiniLM inference; their weights become int8 with per-call activation scaling
+        model[0].auto_model = torch.ao.quantization.quantize_dynamic(model[0].auto_model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    if backend == "onnx-int8":
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": EMBEDDING_ONNX_INT8_FILE})
+    raise ValueError(f"Unknown embedding backend {backend}, expected one of {', '.join(BACKENDS)}")
+
+
+class BackgroundModel:
+    """An embedding model loaded on a background thread.
+
+    `encode` waits for the load to finish, so questions that arrive during a
+    cold start are delayed rather than failed; `status` tells a readiness
+    probe whether that is still happening.
+    """
+
+    def __init__(self, model_name, backend=EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.load_seconds = None
+        self.error = None
+        self._model = None
+        self._loaded = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="embedding-model-loader", daemon=True)
+                self._thread.start()
+
+    def encode(self, texts):
+        self.start()
+        self._loaded.wait()
+        if self.error is not None:
+            raise RuntimeError(f"Embedding model failed to load: {self.error}")
+        return self._model.encode(texts)
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded.is_set() and self.error is None
+
+    def status(self) -> dict:
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "ready": self.ready,
+            "load_seconds": self.load_seconds,
+            "error": str(self.error) if self.error is not None else None
+        }
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self._model = load_model(self.model_name, self.backend)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._loaded.set()
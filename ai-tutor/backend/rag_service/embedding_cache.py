@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+
+# Entries kept in memory, and on disk before the oldest are pruned
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+EMBEDDING_CACHE_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", 200000))
+# Mount a volume here to keep the disk tier across container rebuilds
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "cache")
+
+# Disk size is only checked every this many writes
+PRUNE_EVERY = 1000
+
+
+def normalize_text(text):
+    # Same text the model would see, with insignificant whitespace differences removed
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """Two-tier cache of query embeddings keyed by model name and normalized text.
+
+    Lookups try an in-memory LRU first, then a SQLite file that survives
+    restarts; disk hits are promoted to memory. Vectors are stored as float32.
+    """
+
+    def __init__(self, model_name, max_entries=EMBEDDING_CACHE_SIZE, directory=EMBEDDING_CACHE_DIR,
+                 max_disk_entries=EMBEDDING_CACHE_DISK_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._db = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(directory, "embeddings.sqlite"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+            row = None
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+            self._remember(key, vector)
+            return vector
+
+    def put(self, text, vector):
+        key = self.key(text)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is None:
+                return
+
+            self._db.execute("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                             (key, np.asarray(vector, dtype=np.float32).tobytes()))
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self._prune_disk()
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        # Oldest writes go first; rowid grows with every insert
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_disk_entries:
+            self._db.execute("DELETE FROM embeddings WHERE rowid IN "
+                             "(SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)", (count - self.max_disk_entries,))
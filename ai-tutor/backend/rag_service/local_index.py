@@ -0,0 +1,225 @@
+"""Local snapshot of the chunk embeddings, searched in-process instead of through Neo4j.
+
+Export a snapshot from the graph (uses the same NEO4J_* variables as the service):
+
+    python local_index.py export CSC207 [--directory snapshot/CSC207]
+
+The snapshot is a directory of plain NumPy arrays that are memory-mapped on
+startup, so opening it costs nothing and pages are read as queries touch them:
+
+- vectors.npy     unit-length float32 embeddings, grouped by IVF list
+- centroids.npy   one k-means centroid per list
+- lists.npy       start offset of each list in vectors.npy (plus the end)
+- records.bin     UTF-8 JSON for every chunk, in the same order as vectors.npy
+- offsets.npy     start offset of each record in records.bin (plus the end)
+- meta.json       counts and the properties stored, written last
+"""
+from neo4j_graphrag.retrievers.base import Retriever
+from neo4j_graphrag.types import RawSearchResult, RetrieverResultItem
+from typing import Optional
+import argparse
+import json
+import math
+import os
+import shutil
+import neo4j
+import numpy as np
+
+# Snapshot directory, and how many IVF lists each query scans
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "snapshot")
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", 8))
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _kmeans(vectors, n_lists, iterations, seed):
+    # Spherical k-means: centroids stay unit length so assignment is a dot product
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for index in range(n_lists):
+            members = vectors[assignments == index]
+            if len(members):
+                centroids[index] = members.sum(axis=0)
+        centroids = _unit_rows(centroids)
+    return centroids
+
+
+def build_snapshot(embeddings, records, directory=LOCAL_INDEX_DIR, n_lists=None, iterations=10, seed=0):
+    """Write a snapshot of `embeddings` and their `records` (JSON-serializable dicts) to `directory`.
+
+    The directory is replaced atomically, so a running service that maps the
+    old snapshot keeps working until it reopens.
+    """
+    vectors = _unit_rows(embeddings)
+    if len(vectors) != len(records) or not len(vectors):
+        raise ValueError("Need the same, non-zero number of embeddings and records")
+
+    n_lists = n_lists or max(1, int(math.sqrt(len(vectors))))
+    centroids = _kmeans(vectors, min(n_lists, len(vectors)), iterations, seed)
+    assignments = np.argmax(vectors @ centroids.T, axis=1)
+    # Each list becomes one contiguous slice of the mapped file
+    order = np.argsort(assignments, kind="stable")
+    lists = np.searchsorted(assignments[order], np.arange(len(centroids) + 1)).astype(np.int64)
+
+    encoded = [json.dumps(records[row]).encode("utf-8") for row in order]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(record) for record in encoded])
+
+    staging = f"{directory}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.save(os.path.join(staging, "vectors.npy"), vectors[order])
+    np.save(os.path.join(staging, "centroids.npy"), centroids)
+    np.save(os.path.join(staging, "lists.npy"), lists)
+    np.save(os.path.join(staging, "offsets.npy"), offsets)
+    with open(os.path.join(staging, "records.bin"), "wb") as file:
+        file.write(b"".join(encoded))
+    with open(os.path.join(staging, "meta.json"), "w") as file:
+        json.dump({"count": len(vectors), "dimension": vectors.shape[1], "lists": len(centroids)}, file)
+
+    if os.path.exists(directory):
+        previous = f"{directory}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(directory, previous)
+        os.replace(staging, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+    else:
+        os.replace(staging, directory)
+
+
+class LocalSnapshot:
+    """A memory-mapped snapshot searched with an inverted-file (IVF) index."""
+
+    def __init__(self, directory=LOCAL_INDEX_DIR):
+        with open(os.path.join(directory, "meta.json")) as file:
+            self.meta = json.load(file)
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        self.lists = np.load(os.path.join(directory, "lists.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.records = np.memmap(os.path.join(directory, "records.bin"), dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def record(self, row):
+        return json.loads(self.records[self.offsets[row]:self.offsets[row + 1]].tobytes())
+
+    def search(self, query_vector, top_k=5, nprobe=LOCAL_INDEX_NPROBE):
+        """Return up to `top_k` (row, cosine similarity) pairs, best first, scanning `nprobe` lists."""
+        query = _unit_rows(query_vector)
+        nprobe = min(nprobe, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        rows, scores = [], []
+        for index in probed:
+            start, end = self.lists[index], self.lists[index + 1]
+            if end > start:
+                rows.append(np.arange(start, end))
+                scores.append(self.vectors[start:end] @ query)
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+
+        best = np.argpartition(-scores, min(top_k, len(scores)) - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def exact_search(self, query_vector, top_k=5):
+        """Brute-force search over every vector, used as ground truth when benchmarking."""
+        scores = self.vectors @ _unit_rows(query_vector)
+        best = np.argpartition(-scores, min(top_k, len(scores)) - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best]
+
+
+class LocalVectorRetriever(Retriever):
+    """Vector search over a LocalSnapshot, returning results shaped like HybridRetriever's.
+
+    Nothing is sent to Neo4j, so retrieval latency is bounded by local CPU.
+    Only the vector half of the hybrid search is available; there is no
+    full-text index in the snapshot.
+    """
+
+    VERIFY_NEO4J_VERSION = False
+
+    def __init__(self, snapshot, embedder, nprobe=LOCAL_INDEX_NPROBE, result_formatter=None):
+        # Retriever.__init__ needs a driver; this retriever never talks to the database
+        self.driver = None
+        self.neo4j_database = None
+        self.snapshot = snapshot
+        self.embedder = embedder
+        self.nprobe = nprobe
+        self.result_formatter = result_formatter
+
+    def get_search_results(
+        self,
+        query_text: Optional[str] = None,
+        query_vector: Optional[list[float]] = None,
+        top_k: int = 5,
+        **kwargs
+    ) -> RawSearchResult:
+        if query_vector is None:
+            query_vector = self.embedder.embed_query(query_text)
+
+        records = []
+        for row, score in self.snapshot.search(query_vector, top_k=top_k, nprobe=self.nprobe):
+            records.append(neo4j.Record({"node": self.snapshot.record(row)["node"], "score": score}))
+        return RawSearchResult(records=records, metadata={"nprobe": self.nprobe})
+
+    def default_record_formatter(self, record: neo4j.Record) -> RetrieverResultItem:
+        return RetrieverResultItem(content=str(record.get("node")), metadata={"score": record.get("score")})
+
+
+def export_from_neo4j(driver, index_name, properties, directory=LOCAL_INDEX_DIR):
+    """Snapshot every node covered by the vector index `index_name`, keeping `properties` of each."""
+    index = driver.execute_query(
+        "SHOW VECTOR INDEXES YIELD name, labelsOrTypes, properties WHERE name = $index_name "
+        "RETURN labelsOrTypes[0] AS label, properties[0] AS property",
+        {"index_name": index_name}
+    ).records
+    if not index:
+        raise ValueError(f"No vector index named {index_name}")
+    label, property_name = index[0]["label"], index[0]["property"]
+
+    records = driver.execute_query(
+        f"MATCH (n:`{label}`) WHERE n.`{property_name}` IS NOT NULL "
+        f"RETURN elementId(n) AS id, n.`{property_name}` AS embedding, n AS node"
+    ).records
+
+    embeddings = [record["embedding"] for record in records]
+    snapshot_records = [
+        {"id": record["id"], "node": {name: record["node"].get(name) for name in properties}}
+        for record in records
+    ]
+    build_snapshot(embeddings, snapshot_records, directory)
+    return len(records)
+
+
+def main():
+    from courses import RETURN_PROPERTIES, course_setting
+
+    parser = argparse.ArgumentParser(description="Export a local snapshot of the chunk embeddings")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("course_code")
+    parser.add_argument("--directory")
+    args = parser.parse_args()
+
+    course_code = args.course_code.upper()
+    directory = args.directory or course_setting(course_code, "LOCAL_INDEX_DIR", os.path.join(LOCAL_INDEX_DIR, course_code))
+    driver = neo4j.GraphDatabase.driver(
+        course_setting(course_code, "NEO4J_URI"),
+        auth=(course_setting(course_code, "NEO4J_USERNAME"), course_setting(course_code, "NEO4J_PASSWORD"))
+    )
+    with driver:
+        count = export_from_neo4j(driver, course_setting(course_code, "VECTOR_INDEX", "vector"), RETURN_PROPERTIES, directory)
+    print(f"Exported {count} chunks of {course_code} to {directory}")
+
+if __name__ == '__main__':
+    main()
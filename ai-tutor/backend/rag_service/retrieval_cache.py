@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from embedding_cache import normalize_text
+import os
+import re
+import threading
+import numpy as np
+
+# Retrieval results kept across all courses before the least recently used are evicted
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 20000))
+# Random hyperplanes whose sides make up a query's bucket; fewer bits put more paraphrases in one bucket
+RETRIEVAL_CACHE_BITS = int(os.getenv("RETRIEVAL_CACHE_BITS", 8))
+# Cosine similarity a query needs with the cached query in its bucket to reuse its results
+RETRIEVAL_CACHE_SIMILARITY = float(os.getenv("RETRIEVAL_CACHE_SIMILARITY", 0.95))
+# Every worker derives the same hyperplanes from this seed, so keys agree across processes
+RETRIEVAL_CACHE_SEED = 207
+
+
+def fulltext_terms(text):
+    # The keyword index ignores case, punctuation and word order
+    return " ".join(sorted(set(re.findall(r"\w+", normalize_text(text).lower()))))
+
+
+class RetrievalCache:
+    """LRU cache of ranked retriever results, keyed by course and query.
+
+    The key combines a SimHash of the query embedding, the side of each of
+    `bits` random hyperplanes it falls on, which covers the vector half of the
+    hybrid search, with the query's keyword terms, which cover the full-text
+    half. Paraphrases with close embeddings usually share a bucket; since
+    distant ones occasionally do too, each entry keeps its query vector and a
+    hit also needs `similarity` with it. Entries hold the ranked items with
+    their scores and chunk text, so a hit needs no database round trip.
+    """
+
+    def __init__(self, max_entries=RETRIEVAL_CACHE_SIZE, bits=RETRIEVAL_CACHE_BITS, similarity=RETRIEVAL_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.bits = bits
+        self.similarity = similarity
+        self.hits = 0
+        self.misses = 0
+        # Bucket matches turned away by the similarity check
+        self.rejected = 0
+        self._planes = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, course_code, query_vector, query_text, retriever_config):
+        vector = np.asarray(query_vector, dtype=np.float32)
+        signs = self._hyperplanes(vector.shape[0]) @ vector >= 0
+        return course_code, np.packbits(signs).tobytes(), fulltext_terms(query_text), tuple(sorted(retriever_config.items()))
+
+    def get(self, key, query_vector):
+        vector = _unit(query_vector)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0].shape != vector.shape or float(entry[0] @ vector) < self.similarity:
+                if entry is not None:
+                    self.rejected += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key, query_vector, items):
+        with self._lock:
+            self._entries[key] = (_unit(query_vector), tuple(items))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, course_code) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == course_code]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "rejected": self.rejected
+            }
+
+    def _hyperplanes(self, dimension):
+        with self._lock:
+            planes = self._planes.get(dimension)
+            if planes is None:
+                rng = np.random.default_rng(RETRIEVAL_CACHE_SEED)
+                planes = self._planes[dimension] = rng.standard_normal((self.bits, dimension)).astype(np.float32)
+            return planes
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
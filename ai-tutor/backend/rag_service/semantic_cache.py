@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+import numpy as np
+
+# Cosine similarity a new question needs with a past one to reuse its answer
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+# Answers are regenerated after this many seconds even if the graph has not changed
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", 86400))
+# Answers kept per course; the oldest is overwritten once full
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 5000))
+# Rewrite follow-ups into standalone questions so they are cached too; otherwise only first questions are
+SEMANTIC_CACHE_FOLLOW_UPS = os.getenv("SEMANTIC_CACHE_FOLLOW_UPS", "true").lower() == "true"
+# Recent turns shown to the model when rewriting a follow-up, and the answer characters kept from each
+REWRITE_TURNS = int(os.getenv("REWRITE_TURNS", 3))
+REWRITE_ANSWER_CHARS = int(os.getenv("REWRITE_ANSWER_CHARS", 500))
+
+
+class _CourseAnswers:
+    """Fixed-size ring of unit question vectors and the answers given to them."""
+
+    def __init__(self, capacity, dimension):
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self.expires = np.zeros(capacity, dtype=np.float64)
+        self.answers = [None] * capacity
+        self.next = 0
+
+
+class SemanticAnswerCache:
+    """Past answers per course, found again by question embedding rather than exact text.
+
+    A lookup is one matrix-vector product over the course's stored question
+    vectors, which for a few thousand 384-dimensional entries takes well under
+    a millisecond. Expired entries are skipped by the scan and overwritten as
+    the ring wraps around.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL, max_entries=SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._courses = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, course_code, embedding):
+        """Return the cached answer closest to `embedding` if it passes the threshold, else None."""
+        vector = self._unit(embedding)
+        with self._lock:
+            course = self._courses.get(course_code)
+            if course is not None and course.vectors.shape[1] == vector.shape[0]:
+                similarities = course.vectors @ vector
+                similarities[course.expires <= time.time()] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return dict(course.answers[best], similarity=float(similarities[best]))
+            self.misses += 1
+            return None
+
+    def store(self, course_code, question, embedding, answer, sources):
+        vector = self._unit(embedding)
+        with self._lock:
+            course = self._courses.get(course_code)
+            if course is None or course.vectors.shape[1] != vector.shape[0]:
+                course = self._courses[course_code] = _CourseAnswers(self.max_entries, vector.shape[0])
+
+            slot = course.next % self.max_entries
+            course.vectors[slot] = vector
+            course.expires[slot] = time.time() + self.ttl
+            course.answers[slot] = {"question": question, "answer": answer, "sources": sources}
+            course.next += 1
+
+    def invalidate(self, course_code) -> int:
+        """Drop every answer for a course, e.g. after its graph has been re-ingested."""
+        with self._lock:
+            course = self._courses.pop(course_code, None)
+            if course is None:
+                return 0
+            return int(np.count_nonzero(course.expires > time.time()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.time()
+            lookups = self.hits + self.misses
+            return {
+                "entries": {code: int(np.count_nonzero(course.expires > now)) for code, course in self._courses.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "threshold": self.threshold
+            }
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from typing import Optional
+from neo4j_graphrag.types import RetrieverResultItem
+import os
+
+# Longest chunk text returned with a source; 0 returns it whole
+SOURCE_TEXT_CHARS = int(os.getenv("SOURCE_TEXT_CHARS", 0))
+
+SOURCE_FIELDS = ("source", "chunk", "score")
+
+
+@dataclass(frozen=True, slots=True)
+class SourceRecord:
+    file_name: str
+    text: str
+    score: Optional[float]
+
+    def to_dict(self, fields=None, max_chars=SOURCE_TEXT_CHARS) -> dict:
+        """The source as returned by /ask, keeping only `fields` and cutting the text at `max_chars`."""
+        text = self.text
+        if max_chars and len(text) > max_chars:
+            text = text[:max_chars].rstrip() + "…"
+        values = {"source": self.file_name, "chunk": text, "score": self.score}
+        return {field: values[field] for field in (fields or SOURCE_FIELDS)}
+
+
+def source_record_formatter(record) -> RetrieverResultItem:
+    """Result formatter for the retrievers, building a SourceRecord straight from the Neo4j record.
+
+    The item's content is the text placed in the prompt; the record itself
+    travels in its metadata, so sources never have to be parsed back out of it.
+    """
+    node = record.get("node") or {}
+    source = SourceRecord(
+        file_name=node.get("fileName") or "Unknown",
+        text=node.get("text") or "",
+        score=record.get("score")
+    )
+    return RetrieverResultItem(
+        content=f"Source: {source.file_name}\n{source.text}",
+        metadata={"score": source.score, "source": source}
+    )
+
+
+def source_records(items) -> list:
+    return [item.metadata["source"] for item in items]
+
+
+def format_sources(records, fields=None, max_chars=SOURCE_TEXT_CHARS) -> list:
+    return [record.to_dict(fields, max_chars) for record in records]
@@ -0,0 +1,455 @@
+import unittest
+from embedding_cache import EmbeddingCache
+from batching import Histogram, MicroBatcher
+from admission import AdmissionController, Overloaded
+from semantic_cache import SemanticAnswerCache
+from local_index import LocalSnapshot, build_snapshot
+from sources import SourceRecord, format_sources, source_record_formatter, source_records
+from context_packing import pack_context
+from courses import CourseRegistry, UnknownCourse, course_setting
+import embedding_backends
+from embedding_backends import BackgroundModel
+from retrieval_cache import RetrievalCache, fulltext_terms
+from neo4j_graphrag.types import RetrieverResultItem
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from fastapi.testclient import TestClient
+
+class EmbeddingCacheTestCase(unittest.TestCase):
+    def test_memory_and_disk_tiers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = EmbeddingCache("model", max_entries=1, directory=directory)
+            self.assertIsNone(cache.get("What is  a class?"))
+            cache.put("What is a class?", [0.5, 0.25])
+            # Whitespace differences share an entry
+            self.assertEqual(cache.get(" What is a   class? "), [0.5, 0.25])
+
+            cache.put("Another question", [1.0, 0.0])
+            # The first entry was evicted from memory but is still on disk
+            self.assertEqual(cache.get("What is a class?"), [0.5, 0.25])
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+
+            restarted = EmbeddingCache("model", directory=directory)
+            self.assertEqual(restarted.get("Another question"), [1.0, 0.0])
+            self.assertIsNone(EmbeddingCache("other-model", directory=directory).get("Another question"))
+
+def embed_concurrently(batcher, texts):
+    results, errors = {}, {}
+    start = threading.Barrier(len(texts))
+
+    def call(text):
+        start.wait()
+        try:
+            results[text] = batcher.embed(text)
+        except Exception as e:
+            errors[text] = e
+
+    threads = [threading.Thread(target=call, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results, errors
+
+class MicroBatcherTestCase(unittest.TestCase):
+    def test_concurrent_queries_share_one_call(self):
+        batches = []
+
+        def encode_batch(texts):
+            batches.append(list(texts))
+            return [[float(len(text))] for text in texts]
+
+        batcher = MicroBatcher(encode_batch, max_batch_size=8, max_wait_ms=500)
+        results, errors = embed_concurrently(batcher, ["a", "bb", "ccc", "dddd"])
+        self.assertEqual(errors, {})
+        self.assertEqual(results, {"a": [1.0], "bb": [2.0], "ccc": [3.0], "dddd": [4.0]})
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batcher.stats()["batch_size"]["count"], 1)
+
+    def test_batches_are_capped_at_max_batch_size(self):
+        batches = []
+
+        def encode_batch(texts):
+            batches.append(len(texts))
+            return [[0.0] for _ in texts]
+
+        batcher = MicroBatcher(encode_batch, max_batch_size=2, max_wait_ms=200)
+        results, _ = embed_concurrently(batcher, ["a", "b", "c", "d", "e"])
+        self.assertEqual(len(results), 5)
+        self.assertEqual(sum(batches), 5)
+        self.assertLessEqual(max(batches), 2)
+
+    def test_encoding_error_reaches_every_caller(self):
+        def encode_batch(texts):
+            raise ValueError("model crashed")
+
+        batcher = MicroBatcher(encode_batch, max_batch_size=8, max_wait_ms=200)
+        results, errors = embed_concurrently(batcher, ["a", "b", "c"])
+        self.assertEqual(results, {})
+        self.assertEqual(sorted(errors), ["a", "b", "c"])
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors.values()))
+
+        # The batcher keeps serving after a failed batch
+        batcher.encode_batch = lambda texts: [[1.0] for _ in texts]
+        self.assertEqual(batcher.embed("d"), [1.0])
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram([1, 10])
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot()["buckets"], {"1": 2, "10": 3, "+Inf": 4})
+
+class AdmissionControllerTestCase(unittest.TestCase):
+    def test_questions_beyond_the_queue_are_rejected(self):
+        async def scenario():
+            admission = AdmissionController(workers=1, queue_size=1)
+            started, finish = threading.Event(), threading.Event()
+
+            def slow():
+                started.set()
+                finish.wait(5)
+                return "slow"
+
+            running = asyncio.create_task(admission.run(slow))
+            await asyncio.to_thread(started.wait, 5)
+            queued = asyncio.create_task(admission.run(sum, [1, 2]))
+            await asyncio.sleep(0)
+            # One question runs and one waits, so a third is turned away at once
+            with self.assertRaises(Overloaded):
+                await admission.run(sum, [1])
+
+            finish.set()
+            self.assertEqual((await running, await queued), ("slow", 3))
+            stats = admission.stats()
+            self.assertEqual((stats["admitted"], stats["rejected"], stats["active"], stats["queue_depth"]), (2, 1, 0, 0))
+
+        asyncio.run(scenario())
+
+    def test_streams_hold_their_slot_from_admission(self):
+        async def scenario():
+            admission = AdmissionController(workers=1, queue_size=1)
+            release = await admission.admit()
+            waiting = asyncio.create_task(admission.admit())
+            await asyncio.sleep(0)
+            # A running stream and a queued one fill the service before either has sent a byte
+            with self.assertRaises(Overloaded):
+                await admission.admit()
+
+            items = [item async for item in admission.stream(iter(["a", "b"]), release)]
+            self.assertEqual(items, ["a", "b"])
+            release = await asyncio.wait_for(waiting, timeout=1)
+            # Giving a slot back twice, e.g. from the stream and a background task, frees it once
+            release()
+            release()
+            self.assertEqual(admission.stats()["active"], 0)
+            self.assertEqual(admission.stats()["rejected"], 1)
+            self.assertEqual(await admission.run(sum, [1, 2]), 3)
+
+        asyncio.run(scenario())
+
+class SemanticAnswerCacheTestCase(unittest.TestCase):
+    def test_threshold_course_and_invalidation(self):
+        cache = SemanticAnswerCache(threshold=0.9, ttl=60, max_entries=4)
+        cache.store("CSC207", "What is inheritance?", [1.0, 0.0, 0.0], "An answer", [])
+
+        hit = cache.lookup("CSC207", [0.99, 0.1, 0.0])
+        self.assertEqual(hit["answer"], "An answer")
+        self.assertGreaterEqual(hit["similarity"], 0.9)
+        self.assertIsNone(cache.lookup("CSC207", [0.7, 0.7, 0.0]))
+        self.assertIsNone(cache.lookup("CSC209", [1.0, 0.0, 0.0]))
+
+        self.assertEqual(cache.invalidate("CSC207"), 1)
+        self.assertIsNone(cache.lookup("CSC207", [1.0, 0.0, 0.0]))
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_expired_answers_are_skipped(self):
+        cache = SemanticAnswerCache(threshold=0.9, ttl=0, max_entries=4)
+        cache.store("CSC207", "What is inheritance?", [1.0, 0.0], "An answer", [])
+        self.assertIsNone(cache.lookup("CSC207", [1.0, 0.0]))
+
+    def test_ring_overwrites_oldest(self):
+        cache = SemanticAnswerCache(threshold=0.99, ttl=60, max_entries=2)
+        for i, vector in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])):
+            cache.store("CSC207", f"question {i}", vector, f"answer {i}", [])
+        self.assertIsNone(cache.lookup("CSC207", [1.0, 0.0, 0.0]))
+        self.assertEqual(cache.lookup("CSC207", [0.0, 0.0, 1.0])["answer"], "answer 2")
+
+class LocalSnapshotTestCase(unittest.TestCase):
+    def test_search_matches_exact_when_probing_every_list(self):
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(200, 16))
+        records = [{"id": str(row), "node": {"text": f"chunk {row}"}} for row in range(len(embeddings))]
+
+        with tempfile.TemporaryDirectory() as parent:
+            directory = os.path.join(parent, "CSC207")
+            build_snapshot(embeddings, records, directory, n_lists=8)
+            snapshot = LocalSnapshot(directory)
+            self.assertEqual(len(snapshot), 200)
+            self.assertEqual(snapshot.meta["lists"], 8)
+
+            query = embeddings[17]
+            exact = snapshot.exact_search(query, top_k=5)
+            self.assertEqual(snapshot.search(query, top_k=5, nprobe=8), exact)
+            self.assertEqual(snapshot.record(exact[0][0])["id"], "17")
+            self.assertAlmostEqual(exact[0][1], 1.0, places=5)
+
+            # Rebuilding replaces the directory in place
+            build_snapshot(embeddings[:10], records[:10], directory, n_lists=2)
+            self.assertEqual(len(LocalSnapshot(directory)), 10)
+            self.assertEqual(sorted(os.listdir(parent)), ["CSC207"])
+
+class SourcesTestCase(unittest.TestCase):
+    def test_formatter_builds_records_from_neo4j_records(self):
+        item = source_record_formatter({"node": {"fileName": "week3.pdf", "text": "Interfaces declare methods."}, "score": 0.8})
+        self.assertEqual(item.content, "Source: week3.pdf\nInterfaces declare methods.")
+        self.assertEqual(item.metadata["score"], 0.8)
+        self.assertEqual(source_records([item]), [SourceRecord("week3.pdf", "Interfaces declare methods.", 0.8)])
+        # Missing properties fall back instead of failing the question
+        missing = source_record_formatter({"node": None, "score": None})
+        self.assertEqual(missing.metadata["source"], SourceRecord("Unknown", "", None))
+
+    def test_format_sources_projects_fields_and_truncates(self):
+        records = [SourceRecord("week3.pdf", "Interfaces declare methods.", 0.8)]
+        self.assertEqual(format_sources(records, max_chars=0),
+                         [{"source": "week3.pdf", "chunk": "Interfaces declare methods.", "score": 0.8}])
+        self.assertEqual(format_sources(records, fields=["source", "chunk"], max_chars=10),
+                         [{"source": "week3.pdf", "chunk": "Interfaces…"}])
+        self.assertEqual(format_sources(records, fields=["score"]), [{"score": 0.8}])
+
+class WordCounter:
+    """One token per word, so budgets in these tests are easy to reason about."""
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[:max_tokens])
+
+class PackContextTestCase(unittest.TestCase):
+    def item(self, words, score):
+        return RetrieverResultItem(content=" ".join(["word"] * words), metadata={"score": score})
+
+    def test_history_is_capped_by_its_share(self):
+        turns = [{"question": "q " * 10, "answer": "a " * 10} for _ in range(5)]
+        packed = pack_context([], turns, WordCounter(), summary="earlier topics", budget=100, history_share=0.5)
+        # 2 summary tokens leave room for two 20-token turns within 50
+        self.assertEqual(packed.dropped_turns, 3)
+        self.assertEqual([message["role"] for message in packed.history], ["system", "user", "assistant", "user", "assistant"])
+        self.assertEqual(packed.tokens, 42)
+
+    def test_chunks_fill_by_score_and_last_is_truncated(self):
+        items = [self.item(60, 0.5), self.item(30, 0.9), self.item(500, 0.7)]
+        packed = pack_context(items, [], WordCounter(), budget=200, history_share=0.3)
+        self.assertEqual([item.metadata["score"] for item in packed.items], [0.9, 0.7])
+        self.assertEqual(len(packed.items[1].content.split()), 170)
+        self.assertEqual(packed.tokens, 200)
+        self.assertEqual(packed.dropped_items, 1)
+
+    def test_small_remainder_is_not_truncated_into(self):
+        items = [self.item(90, 0.9), self.item(100, 0.8)]
+        packed = pack_context(items, [], WordCounter(), budget=100, history_share=0.3)
+        self.assertEqual(len(packed.items), 1)
+        self.assertEqual(packed.dropped_items, 1)
+
+class CourseRegistryTestCase(unittest.TestCase):
+    def registry(self, loads):
+        registry = CourseRegistry(embedder=None, llm=None, course_codes=["CSC207", "CSC209"])
+
+        def load(course_code):
+            loads.append(course_code)
+            time.sleep(0.05)
+            return f"pipeline for {course_code}"
+
+        registry._load = load
+        return registry
+
+    def test_courses_load_once_on_first_use(self):
+        loads = []
+        registry = self.registry(loads)
+        self.assertEqual(registry.stats()["loaded"], [])
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("csc207"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        # Concurrent first questions wait for one load instead of each building the pipeline
+        self.assertEqual(results, ["pipeline for CSC207"] * 4)
+        self.assertEqual(loads, ["CSC207"])
+
+        registry.preload()
+        self.assertEqual(loads, ["CSC207", "CSC209"])
+        self.assertEqual(registry.stats()["loaded"], ["CSC207", "CSC209"])
+
+    def test_unknown_course_is_rejected(self):
+        loads = []
+        registry = self.registry(loads)
+        with self.assertRaises(UnknownCourse):
+            registry.get("MAT137")
+        self.assertEqual((registry.default_course, loads), ("CSC207", []))
+
+    def test_course_settings_fall_back_to_shared_ones(self):
+        with mock.patch.dict(os.environ, {"CSC209_VECTOR_INDEX": "csc209_vector", "VECTOR_INDEX": "vector"}):
+            self.assertEqual(course_setting("CSC209", "VECTOR_INDEX"), "csc209_vector")
+            self.assertEqual(course_setting("CSC207", "VECTOR_INDEX"), "vector")
+        self.assertEqual(course_setting("CSC207", "UNSET_SETTING", "default"), "default")
+
+class FakeModel:
+    def encode(self, texts):
+        return np.array([[float(len(text))] for text in texts])
+
+class BackgroundModelTestCase(unittest.TestCase):
+    def test_encode_waits_for_the_load(self):
+        loaded = threading.Event()
+
+        def load_model(model_name, backend):
+            loaded.wait(5)
+            return FakeModel()
+
+        with mock.patch.object(embedding_backends, "load_model", load_model):
+            model = BackgroundModel("model", backend="onnx")
+            model.start()
+            self.assertFalse(model.status()["ready"])
+
+            loaded.set()
+            self.assertEqual(model.encode(["ab"]).tolist(), [[2.0]])
+        status = model.status()
+        self.assertTrue(status["ready"])
+        self.assertEqual((status["backend"], status["error"]), ("onnx", None))
+        self.assertIsNotNone(status["load_seconds"])
+
+    def test_load_failure_reaches_callers(self):
+        def load_model(model_name, backend):
+            raise OSError("model not found")
+
+        with mock.patch.object(embedding_backends, "load_model", load_model):
+            model = BackgroundModel("model")
+            with self.assertRaisesRegex(RuntimeError, "model not found"):
+                model.encode(["question"])
+        self.assertFalse(model.ready)
+        self.assertEqual(model.status()["error"], "model not found")
+
+class AppTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The app builds its clients at import; neither the model nor OpenAI is contacted by these tests
+        with mock.patch.object(embedding_backends, "EMBEDDING_PRELOAD", False), \
+                mock.patch.dict(os.environ, {"OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "test")}):
+            import app
+        cls.app = app
+        cls.client = TestClient(app.app)
+
+    def model(self, load_model):
+        with mock.patch.object(embedding_backends, "load_model", load_model):
+            model = BackgroundModel("model")
+            model.start()
+            model._loaded.wait(5)
+        return mock.patch.object(self.app.embedder, "model", model)
+
+    def test_unknown_course_is_not_found(self):
+        response = self.client.post("/ask/MAT137", json={"question": "What is a class?", "message_history": []})
+        self.assertEqual(response.status_code, 404)
+
+    def test_ready_reflects_the_model(self):
+        with mock.patch.object(self.app.embedder, "model", BackgroundModel("model")):
+            # Not loaded yet
+            response = self.client.get("/ready")
+            self.assertEqual(response.status_code, 503)
+            self.assertFalse(response.json()["detail"]["ready"])
+
+        with self.model(lambda model_name, backend: FakeModel()):
+            self.assertTrue(self.client.get("/ready").json()["ready"])
+
+        def fail(model_name, backend):
+            raise OSError("model not found")
+
+        with self.model(fail):
+            response = self.client.get("/ready")
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()["detail"]["error"], "model not found")
+
+    def test_follow_ups_share_answers_through_their_standalone_question(self):
+        app = self.app
+        generated = []
+
+        def create(messages, model, **params):
+            if messages[0]["content"] == app.REWRITE_INSTRUCTIONS:
+                self.assertIn("Student: What is the observer pattern?", messages[1]["content"])
+                content = "What are the drawbacks of the observer pattern?"
+            else:
+                generated.append(messages)
+                content = "Observers that are never removed keep their subjects alive."
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        retrieve = mock.Mock(return_value=(None, []))
+        embed = lambda text: [1.0, 0.0] if "drawbacks of the observer" in text else [0.0, 1.0]
+        with mock.patch.object(app.llm, "client", client), \
+                mock.patch.object(app, "answer_cache", SemanticAnswerCache(threshold=0.9, ttl=60, max_entries=4)), \
+                mock.patch.object(app.embedder, "embed_query", embed), \
+                mock.patch.object(app, "retrieve", retrieve), \
+                mock.patch.object(app, "build_prompt", return_value=([{"role": "user", "content": "prompt"}], SimpleNamespace(items=[]))):
+            first = app.answer_question(
+                "CSC207", "What are its drawbacks?",
+                [{"question": "What is the observer pattern?", "answer": "Subjects notify their observers."}],
+                "", {"top_k": 5}, {"fields": None, "max_chars": 0}
+            )
+            # Another student reaches the same question through a different conversation
+            second = app.answer_question(
+                "CSC207", "Any downsides?",
+                [{"question": "What is the observer pattern?", "answer": "A way to publish events."}],
+                "- Q: What is a design pattern?", {"top_k": 5}, {"fields": None, "max_chars": 0}
+            )
+
+        self.assertEqual(second["answer"], first["answer"])
+        self.assertEqual(len(generated), 1)
+        retrieve.assert_called_once_with("CSC207", "What are the drawbacks of the observer pattern?", {"top_k": 5})
+
+class RetrievalCacheTestCase(unittest.TestCase):
+    def test_key_hashes_vector_and_terms(self):
+        cache = RetrievalCache(max_entries=2, bits=8)
+        config = {"top_k": 5}
+        rng = np.random.default_rng(0)
+        vector = rng.standard_normal(384)
+        key = cache.key("CSC207", vector, "What is an interface?", config)
+        # Scale and small differences land in the same bucket; word order and case do not matter
+        nearby = 2 * vector + 0.01 * rng.standard_normal(384)
+        self.assertEqual(key, cache.key("CSC207", nearby, "an INTERFACE is what", config))
+        self.assertNotEqual(key, cache.key("CSC207", -vector, "What is an interface?", config))
+        self.assertNotEqual(key, cache.key("CSC207", vector, "What is an abstract class?", config))
+        self.assertNotEqual(key, cache.key("CSC207", vector, "What is an interface?", {"top_k": 10}))
+        self.assertEqual(fulltext_terms("Hello, hello world!"), "hello world")
+
+    def test_hit_needs_a_similar_query(self):
+        cache = RetrievalCache(similarity=0.95)
+        key = cache.key("CSC207", [0.6, 0.8], "question", {})
+        cache.put(key, [0.6, 0.8], ["item"])
+
+        self.assertEqual(cache.get(key, [0.62, 0.79]), ["item"])
+        # A query that hashes to the same bucket but points elsewhere is a miss
+        self.assertIsNone(cache.get(key, [1.0, 0.0]))
+        self.assertEqual(cache.stats()["rejected"], 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_lru_and_invalidation(self):
+        cache = RetrievalCache(max_entries=2)
+        vectors = [[float(i), 1.0] for i in range(3)]
+        keys = [cache.key(course, vector, "question", {}) for vector, course in zip(vectors, ["CSC207", "CSC207", "CSC209"])]
+        for i, key in enumerate(keys):
+            cache.put(key, vectors[i], [f"item {i}"])
+
+        self.assertIsNone(cache.get(keys[0], vectors[0]))
+        self.assertEqual(cache.get(keys[1], vectors[1]), ["item 1"])
+        self.assertEqual(cache.invalidate("CSC207"), 1)
+        self.assertIsNone(cache.get(keys[1], vectors[1]))
+        self.assertEqual(cache.get(keys[2], vectors[2]), ["item 2"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,21 @@
 import unittest
-from api_service import db, create_app
+from api_service import db, bcrypt, create_app
+from api_service.models import ConversationContext, Course, Question, TokenBlocklist, User
+from api_service.catalog import CatalogSnapshot
+from api_service.enrollment import EnrollmentCache
+from api_service.main import limiter, save_answer
+from api_service.revocation import RevocationCache, purge_expired_tokens
+from datetime import datetime, timedelta, timezone
+from api_service.rag_client import CircuitBreaker, RagClient, RagServiceUnavailable
+from api_service.conversation import CONVERSATION_WINDOW_TURNS, get_context, append_turn, clear_context
+from api_service.history import iter_history
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from flask_jwt_extended import decode_token
+from unittest import mock
+import gzip
 import json
+import os
+import threading
 
 class CustomTestResult(unittest.TextTestResult):
     def addSuccess(self, test):
@@ -22,6 +37,47 @@ class CustomTestResult(unittest.TextTestResult):
 class CustomTestRunner(unittest.TextTestRunner):
     resultclass = CustomTestResult
 
+class FakeRagHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    paths = []
+
+    def do_POST(self):
+        FakeRagHandler.paths.append(self.path)
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        sources = [{"source": "week2-lecture-slides.pdf", "chunk": "Observers are notified", "score": 0.9}]
+        if payload.get("stream"):
+            events = [("sources", {"sources": sources}), ("token", {"token": "Observers "}),
+                      ("token", {"token": "get notified"}), ("done", {"answer": "Observers get notified"})]
+            body = "".join(f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in events).encode('utf-8')
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({"answer": "Observers get notified", "sources": sources}).encode('utf-8')
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TruncatedRagHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        # The service dies part way through its answer
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "100")
+        self.end_headers()
+        self.wfile.write(b'{"answer": "Obs')
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
 class FlaskAppTestCase(unittest.TestCase):
     def create_app(self):
         app = create_app()
@@ -54,6 +110,34 @@ class FlaskAppTestCase(unittest.TestCase):
         print("Update Courses:", response.get_json())
         self.assertEqual(response.status_code, 200)
 
+    def register_and_login(self, username):
+        register_payload = {
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "password123"
+        }
+        response = self.client.post(
+            "/auth/register",
+            data=json.dumps(register_payload),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+
+        login_payload = {
+            "email": f"{username}@example.com",
+            "password": "password123"
+        }
+        response = self.client.post(
+            "/auth/login",
+            data=json.dumps(login_payload),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {response.get_json()['access_token']}"
+        }
+
     def test_update_courses(self):
         self.update_courses()
 
@@ -297,5 +381,301 @@ class FlaskAppTestCase(unittest.TestCase):
         print("Get Courses:", response.get_json())
         self.assertEqual(response.status_code, 200)
 
+    def test_conversation_context_is_bounded(self):
+        with self.app.app_context():
+            for i in range(CONVERSATION_WINDOW_TURNS + 3):
+                context = get_context("contextuser", "CSC207")
+                append_turn(context, f"What is pattern {i}?", "<b>An answer</b>")
+                db.session.commit()
+
+            context = get_context("contextuser", "CSC207")
+            print("Context:", context.recent_turns, context.summary)
+            self.assertEqual(len(context.recent_turns), CONVERSATION_WINDOW_TURNS)
+            self.assertEqual(context.turn_count, CONVERSATION_WINDOW_TURNS + 3)
+            self.assertEqual(context.recent_turns[-1]["question"], f"What is pattern {CONVERSATION_WINDOW_TURNS + 2}")
+            self.assertNotIn("<", context.recent_turns[-1]["answer"])
+            self.assertIn("What is pattern 0", context.summary)
+            # Evicted answers keep a snippet, so follow-ups can refer back to them
+            self.assertIn("Q: What is pattern 0 A: ltbgtAn answerltbgt", context.summary)
+            self.assertNotIn(f"What is pattern {CONVERSATION_WINDOW_TURNS + 2}", context.summary)
+
+            clear_context("contextuser", "CSC207")
+            db.session.commit()
+            self.assertIsNone(db.session.get(ConversationContext, ("contextuser", "CSC207")))
+
+    def test_concurrent_first_questions_share_one_context(self):
+        self.update_courses()
+        with self.app.app_context():
+            context = get_context("raceuser", "CSC207")
+            # Another request saves its first question before this one commits
+            with db.engine.begin() as connection:
+                connection.execute(ConversationContext.__table__.insert().values(
+                    user_id="raceuser", course_code="CSC207", summary='', turn_count=1,
+                    recent_turns=[{"question": "first", "answer": "one"}]
+                ))
+
+            save_answer(context, "raceuser", "CSC207", "second", "two", [])
+            context = db.session.get(ConversationContext, ("raceuser", "CSC207"))
+            self.assertEqual(context.turn_count, 2)
+            self.assertEqual([turn["question"] for turn in context.recent_turns], ["first", "second"])
+            self.assertEqual(Question.query.filter_by(user_id="raceuser").count(), 1)
+
+    def test_message_history_pagination(self):
+        self.update_courses()
+        auth_headers = self.register_and_login("historyuser")
+        response = self.client.post("/courses/enroll/CSC207", headers=auth_headers)
+        self.assertEqual(response.status_code, 200)
+
+        with self.app.app_context():
+            for i in range(5):
+                db.session.add(Question(user_id="historyuser", course_code="CSC207", question_text=f"question {i}", answer_text=f"answer {i}"))
+            db.session.commit()
+
+        response = self.client.get("/message_history/CSC207?limit=2", headers=auth_headers)
+        page = response.get_json()
+        print("Newest Page:", page)
+        self.assertEqual([qa["question"] for qa in page["message_history"]], ["question 3", "question 4"])
+        self.assertTrue(page["has_more"])
+
+        response = self.client.get(f"/message_history/CSC207?limit=5&before={page['before']}", headers=auth_headers)
+        older = response.get_json()
+        self.assertEqual([qa["question"] for qa in older["message_history"]], ["question 0", "question 1", "question 2"])
+        self.assertFalse(older["has_more"])
+
+        response = self.client.get(f"/message_history/CSC207?after={older['after']}", headers=auth_headers)
+        self.assertEqual([qa["question"] for qa in response.get_json()["message_history"]], ["question 3", "question 4"])
+
+        response = self.client.get("/message_history/CSC207?stream=1", headers=auth_headers)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.data.decode("utf-8").splitlines()]
+        self.assertEqual([qa["question"] for qa in lines], [f"question {i}" for i in range(5)])
+
+        # A limited stream counts from the newest question, like a page
+        response = self.client.get("/message_history/CSC207?stream=1&limit=2", headers=auth_headers)
+        lines = [json.loads(line) for line in response.data.decode("utf-8").splitlines()]
+        self.assertEqual([qa["question"] for qa in lines], ["question 3", "question 4"])
+
+        # The oldest row of a limited stream is found by walking back in keyset batches
+        with self.app.app_context(), mock.patch("api_service.history.HISTORY_STREAM_BATCH", 2):
+            self.assertEqual([qa.question_text for qa in iter_history("historyuser", "CSC207", limit=3)],
+                             ["question 2", "question 3", "question 4"])
+            self.assertEqual([qa.question_text for qa in iter_history("historyuser", "CSC207", limit=50)],
+                             [f"question {i}" for i in range(5)])
+
+        response = self.client.get("/message_history/CSC207?before=not-a-cursor", headers=auth_headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_rag_client_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.snapshot()["state"], CircuitBreaker.OPEN)
+
+        # Once the reset timeout passes a single probe is let through
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.snapshot()["state"], CircuitBreaker.CLOSED)
+
+        client = RagClient("CSC000", "http://127.0.0.1:9")
+        client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        with self.assertRaises(RagServiceUnavailable):
+            client.post("/ask", {"question": "Unreachable?"})
+        with self.assertRaises(RagServiceUnavailable):
+            client.post("/ask", {"question": "Fails fast?"})
+        self.assertEqual(client.stats()["breaker"]["rejected"], 1)
+
+        # A response cut off mid-body still counts as a failure, so the next probe is let through
+        server = ThreadingHTTPServer(("127.0.0.1", 0), TruncatedRagHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            client = RagClient("CSC000", f"http://127.0.0.1:{server.server_port}")
+            client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+            for _ in range(2):
+                with self.assertRaises(RagServiceUnavailable):
+                    client.post("/ask", {"question": "Cut off?"})
+            self.assertEqual(client.stats()["breaker"]["rejected"], 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        response = self.client.get("/rag-status", headers={"Authorization": "Bearer R6JV8jeiZx"})
+        print("RAG Status:", response.get_json())
+        self.assertEqual(response.status_code, 200)
+
+    def test_ask_streams_and_saves_answer(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRagHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ['RAG_SERVICE_CSC207_URL'] = f"http://127.0.0.1:{server.server_port}"
+
+        try:
+            self.update_courses()
+            auth_headers = self.register_and_login("streamuser")
+            self.client.post("/courses/enroll/CSC207", headers=auth_headers)
+
+            response = self.client.post(
+                "/ask/CSC207",
+                data=json.dumps({"question": "What is the observer pattern?", "stream": True}),
+                headers=auth_headers
+            )
+            body = response.data.decode("utf-8")
+            print("Ask Stream:", body)
+            self.assertEqual(response.mimetype, "text/event-stream")
+            self.assertIn("event: token", body)
+            self.assertIn("event: done", body)
+            self.assertEqual(FakeRagHandler.paths[-1], "/ask/CSC207")
+
+            response = self.client.get("/message_history/CSC207", headers=auth_headers)
+            history = response.get_json()["message_history"]
+            self.assertEqual(history[-1]["answer"], "Observers get notified")
+            self.assertEqual(history[-1]["sources"], [{"source": "week2-lecture-slides.pdf", "score": 0.9}])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_logout_revokes_token_and_purge_removes_expired(self):
+        auth_headers = self.register_and_login("revokeuser")
+        response = self.client.post("/auth/logout", headers=auth_headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/courses/user-courses", headers=auth_headers)
+        print("User Courses after Logout:", response.get_json())
+        self.assertEqual(response.status_code, 401)
+
+        with self.app.app_context():
+            db.session.add(TokenBlocklist(jti="expired-token", created_at=datetime.now(timezone.utc) - timedelta(days=1)))
+            db.session.commit()
+            self.assertEqual(purge_expired_tokens(), 1)
+            self.assertEqual(TokenBlocklist.query.count(), 1)
+
+    def test_revocation_after_purge_reaches_other_workers(self):
+        auth_headers = self.register_and_login("purgeuser")
+        with self.app.app_context():
+            db.session.add(TokenBlocklist(jti="expired-token", created_at=datetime.now(timezone.utc) - timedelta(days=1)))
+            db.session.commit()
+            # Another worker has seen the expired row before it is purged
+            other_worker = RevocationCache(sync_interval=0)
+            other_worker.sync()
+            self.assertEqual(purge_expired_tokens(), 1)
+
+        response = self.client.post("/auth/logout", headers=auth_headers)
+        self.assertEqual(response.status_code, 200)
+
+        with self.app.app_context():
+            jti = decode_token(auth_headers["Authorization"].split()[1])["jti"]
+            self.assertTrue(other_worker.is_revoked(jti))
+
+    def test_enrollment_cache_writes_through_and_evicts(self):
+        self.update_courses()
+        auth_headers = self.register_and_login("cacheuser")
+        response = self.client.post("/courses/enroll/CSC207", headers=auth_headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post("/courses/enroll/CSC207", headers=auth_headers)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.delete("/courses/drop-course/CSC207", headers=auth_headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/message_history/CSC207", headers=auth_headers)
+        self.assertEqual(response.status_code, 403)
+
+        with self.app.app_context():
+            cache = EnrollmentCache(max_size=2, ttl=60)
+            for user_id in ("cacheuser", "other1", "other2"):
+                cache.get_courses(user_id)
+            self.assertEqual(cache.stats()["size"], 2)
+            self.assertFalse(cache.is_enrolled("other2", "CSC207"))
+            self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_available_courses_conditional_get(self):
+        self.update_courses()
+        response = self.client.get("/courses/")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        self.assertTrue(any(course["code"] == "CSC207" for course in response.get_json()["courses"]))
+
+        response = self.client.get("/courses/", headers={"If-None-Match": etag})
+        print("Courses Revalidation:", response.status_code)
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_reaches_other_workers(self):
+        self.update_courses()
+        with self.app.app_context():
+            # Each snapshot stands in for the catalog held by a separate worker
+            worker, other_worker = CatalogSnapshot(check_interval=0), CatalogSnapshot(check_interval=0)
+            body, etag = other_worker.get()
+
+            course = db.session.get(Course, "CSC207")
+            course.name = "Renamed course"
+            worker.invalidate()
+            db.session.commit()
+
+            new_body, new_etag = other_worker.get()
+            self.assertNotEqual(new_etag, etag)
+            self.assertIn(b"Renamed course", new_body)
+            self.assertEqual(worker.get(), (new_body, new_etag))
+
+    def test_flowchart_is_precompressed_and_conditional(self):
+        os.environ['CSC207_FLOWCHART'] = 'assets/CSC207_flowchart.json'
+        with open('assets/CSC207_flowchart.json', 'rb') as file:
+            content = file.read()
+
+        response = self.client.get("/courses/get-flowchart/CSC207", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.data), content)
+
+        response = self.client.get("/courses/get-flowchart/CSC207", headers={"If-None-Match": response.headers["ETag"], "Accept-Encoding": "gzip"})
+        print("Flowchart Revalidation:", response.status_code)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get("/courses/get-flowchart/CSC207")
+        self.assertEqual(response.data, content)
+
+    def test_login_rehashes_password_with_configured_cost(self):
+        with self.app.app_context():
+            old_hash = bcrypt.generate_password_hash("password123", rounds=4).decode('utf-8')
+            db.session.add(User(username="rehashuser", email="rehashuser@example.com", password=old_hash))
+            db.session.commit()
+
+        response = self.client.post(
+            "/auth/login",
+            data=json.dumps({"email": "rehashuser@example.com", "password": "password123"}),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        with self.app.app_context():
+            new_hash = User.query.filter_by(username="rehashuser").first().password
+            self.assertEqual(new_hash.split('$')[2], str(self.app.config["BCRYPT_LOG_ROUNDS"]))
+            self.assertTrue(bcrypt.check_password_hash(new_hash, "password123"))
+
+    def test_ask_is_rate_limited_per_user(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRagHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ['RAG_SERVICE_CSC207_URL'] = f"http://127.0.0.1:{server.server_port}"
+
+        try:
+            limiter.reset()
+            self.update_courses()
+            auth_headers = self.register_and_login("ratelimituser")
+            self.client.post("/courses/enroll/CSC207", headers=auth_headers)
+
+            statuses = []
+            for i in range(6):
+                response = self.client.post(
+                    "/ask/CSC207",
+                    data=json.dumps({"question": f"Question {i}?"}),
+                    headers=auth_headers
+                )
+                statuses.append(response.status_code)
+            print("Ask Statuses:", statuses)
+            self.assertEqual(statuses, [200] * 5 + [429])
+            self.assertIn("error", response.get_json())
+        finally:
+            server.shutdown()
+            server.server_close()
+
 if __name__ == '__main__':
     unittest.main(testRunner=CustomTestRunner())
\ No newline at end of file
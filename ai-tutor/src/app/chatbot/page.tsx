@@ -22,6 +22,40 @@ interface Course {
   code: string;
 }
 
+interface HistoryEntry {
+  question: string;
+  answer: string;
+  sources?: { source: string | null; score: number }[];
+}
+
+function historyToMessages(history: HistoryEntry[]): Message[] {
+  return history
+    .map((qa) => {
+      const parsedAnswer = marked(qa.answer);
+
+      const extractedSources = (qa.sources ?? [])
+        .map(src => ({ source: src.source, score: src.score.toFixed(2) }))
+        .filter((s: { source: string | null }) => s.source);
+
+      const sourceListHtml = extractedSources.length > 0
+        ? `
+        <div style="margin-top: 1rem;">
+          <strong>Sources:</strong>
+          <div style="margin-top: 0.5rem;">
+            ${extractedSources.map((src) => `<div style="margin: 2px 0;">• ${src.source} (Similarity score: ${src.score})</div>`).join("")}
+          </div>
+        </div>
+      `
+        : "";
+
+      return [
+        { text: qa.question, sender: "user" as const },
+        { text: parsedAnswer + sourceListHtml, sender: "bot" as const },
+      ];
+    })
+    .flat();
+}
+
 export default function Chatbot({
   searchParams,
 }: {
@@ -38,6 +72,9 @@ export default function Chatbot({
   const [messages, setMessages] = useState<Record<string, Message[]>>({});
   const [input, setInput] = useState("");
   const [courseError, setCourseError] = useState<string | null>(null);
+  // Cursor of the next older history page per course, null once the oldest is loaded
+  const [olderHistory, setOlderHistory] = useState<Record<string, string | null>>({});
+  const loadingOlderRef = useRef(false);
   const { chatRef, scrollToBottom } = useAutoScroll();
 
   // Use a ref as a lock so that the landing query is executed only once
@@ -71,7 +108,8 @@ export default function Chatbot({
         setEnrolledCourses(enrolledCourseCodes);
         setChatbotCourses(coursesWithChatbot);
         for (const courseCode of enrolledCourseCodes) {
-          const data = await getHistory(courseCode);
+          // Only whether any history exists matters here
+          const data = await getHistory(courseCode, null, 1);
           if (data && data.length !== 0) {
             setSelectedSidebarCourses((prev) => {
               const course = allCoursesResponse.courses.find((c: { code: string }) => c.code === courseCode);
@@ -91,45 +129,24 @@ export default function Chatbot({
   const fetchMessageHistory = useCallback(
     async (course: string) => {
       try {
+        // Only the newest page is loaded here; older ones are fetched on demand
         const data = await getHistory(course);
         if (!data || data.length === 0) {
           setMessages((prev) => ({
             ...prev,
             [course]: prev[course] || [],
           }));
+          setOlderHistory((prev) => ({ ...prev, [course]: null }));
           scrollToBottom();
           return;
         }
 
-        const messageHistory = data.message_history
-        .map((qa: { question: string; answer: string; sources? }) => {
-          const parsedAnswer = marked(qa.answer);
-
-            const extractedSources = (qa.sources ?? [])
-              .map(src => ({ source: src.source, score: src.score.toFixed(2) }))
-              .filter((s: { source: string | null }) => s.source);
-
-            const sourceListHtml = extractedSources.length > 0
-              ? `
-              <div style="margin-top: 1rem;">
-                <strong>Sources:</strong>
-                <div style="margin-top: 0.5rem;">
-                  ${extractedSources.map((src: { source: string, score: number }) => `<div style="margin: 2px 0;">• ${src.source} (Similarity score: ${src.score})</div>`).join("")}
-                </div>
-              </div>
-            `
-              : "";
-
-            return [
-              { text: qa.question, sender: "user" },
-              { text: parsedAnswer + sourceListHtml, sender: "bot" },
-            ];
-          })
-          .flat();
+        const messageHistory = historyToMessages(data.message_history);
         setMessages((prev) => ({
           ...prev,
           [course]: (prev[course] || []).concat(messageHistory),
         }));
+        setOlderHistory((prev) => ({ ...prev, [course]: data.has_more ? data.before : null }));
         setSelectedSidebarCourses((prev) => {
           const courseObj = allCourses.find(c => c.code === course);
           if (courseObj && !prev.some(c => c.code === course)) {
@@ -145,6 +162,41 @@ export default function Chatbot({
     [scrollToBottom, allCourses]
   );
 
+  const loadOlderHistory = useCallback(async () => {
+    const course = activeCourse;
+    const before = course ? olderHistory[course] : null;
+    if (!course || !before || loadingOlderRef.current) return;
+
+    loadingOlderRef.current = true;
+    try {
+      const data = await getHistory(course, before);
+      if (!data || data.length === 0) {
+        setOlderHistory((prev) => ({ ...prev, [course]: null }));
+        return;
+      }
+
+      // Keep the messages in view where they are while older ones are added above
+      const chat = chatRef.current;
+      const previousHeight = chat ? chat.scrollHeight : 0;
+      setMessages((prev) => {
+        const current = prev[course] || [];
+        // The greeting stays first
+        return {
+          ...prev,
+          [course]: [...current.slice(0, 1), ...historyToMessages(data.message_history), ...current.slice(1)],
+        };
+      });
+      setOlderHistory((prev) => ({ ...prev, [course]: data.has_more ? data.before : null }));
+      requestAnimationFrame(() => {
+        if (chat) chat.scrollTop = chat.scrollHeight - previousHeight;
+      });
+    } catch (error) {
+      console.error("Failed to load older messages:", error);
+    } finally {
+      loadingOlderRef.current = false;
+    }
+  }, [activeCourse, olderHistory, chatRef]);
+
   const updateEnrollmentStatus = useCallback(async () => {
     try {
       const userCoursesResponse = await getUserCourses();
@@ -385,7 +437,18 @@ export default function Chatbot({
           </div>
         </aside>
         <main className="flex-1 flex flex-col h-full">
-          <div ref={chatRef} className="flex-1 p-4 overflow-y-auto min-h-0">
+          <div
+            ref={chatRef}
+            className="flex-1 p-4 overflow-y-auto min-h-0"
+            onScroll={(e) => e.currentTarget.scrollTop === 0 && loadOlderHistory()}
+          >
+            {activeCourse && olderHistory[activeCourse] && (
+              <div className="mb-2 flex justify-center">
+                <button className="text-blue-500 underline" onClick={loadOlderHistory}>
+                  Load earlier messages
+                </button>
+              </div>
+            )}
             {(activeCourse && messages[activeCourse]
               ? messages[activeCourse]
               : []
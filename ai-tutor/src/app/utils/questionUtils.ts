@@ -1,6 +1,6 @@
 const API_BASE_URL = "https://advsry.utm.utoronto.ca/api";
 
-export async function getHistory(courseCode: string) {
+export async function getHistory(courseCode: string, before: string | null = null, limit?: number) {
   const token = localStorage.getItem("authToken");
 
   if (!token) {
@@ -8,7 +8,12 @@ export async function getHistory(courseCode: string) {
   }
 
   try {
-    const response = await fetch(`${API_BASE_URL}/message_history/${courseCode}`, {
+    // One page of the newest questions, or of the ones older than the `before` cursor
+    const params = new URLSearchParams();
+    if (before) params.set("before", before);
+    if (limit) params.set("limit", String(limit));
+    const query = params.toString() ? `?${params}` : "";
+    const response = await fetch(`${API_BASE_URL}/message_history/${courseCode}${query}`, {
       method: "GET",
       headers: {
         "Content-Type": "application/json",
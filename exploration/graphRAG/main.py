@@ -1,8 +1,21 @@
 import os
+import json
+import time
+import hashlib
+import threading
+import argparse
+import re
+import zlib
+import requests
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from neo4j import GraphDatabase
+from typing import Any, List, Dict, Iterable, Iterator, Optional, Set, Tuple
 from urllib.parse import urlparse
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Neo4jVector
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -10,7 +23,8 @@ from langchain_community.document_loaders import (
     WebBaseLoader, 
     PlaywrightURLLoader, 
     PyPDFLoader,
-    YoutubeLoader
+    YoutubeLoader,
+    BSHTMLLoader
 )
 
 class ResourceProcessor:
@@ -23,14 +37,14 @@ class ResourceProcessor:
         return 'youtube.com' in parsed.netloc or 'youtu.be' in parsed.netloc
 
     @staticmethod
-    def safe_load_resource(url: str, resource_type: str) -> List[Document]:
+    def safe_load_resource(url: str, resource_type: str, timeout: Optional[float] = None) -> List[Document]:
         """
         Safely load content from different resource types.
         """
         try:
             if resource_type.lower() == 'webpage':
                 try:
-                    loader = WebBaseLoader(url)
+                    loader = WebBaseLoader(url, requests_kwargs={"timeout": timeout} if timeout else None)
                     return loader.load()
                 except Exception as e:
                     print(f"WebBaseLoader failed for {url}: {e}")
@@ -62,6 +76,189 @@ class ResourceProcessor:
             print(f"Failed to load resource {url}: {e}")
             return []
 
+class ConcurrentResourceLoader:
+    """
+    Loads up to `max_workers` resources at once, yielding each one as soon as it completes.
+    
+    At most `per_host_limit` fetches run against one host at a time; work for
+    other hosts is scheduled meanwhile. Remote PDFs and web pages are fetched
+    with a `timeout` and their raw bytes cached under `cache_dir`. On later runs
+    the cached copy is revalidated with a conditional request, so a changed
+    resource is downloaded again and an unchanged one costs a 304; with
+    `revalidate=False` the cache is trusted as is. YouTube transcripts are
+    cached as documents. Anything else goes through `ResourceProcessor`.
+    Loaders that take no timeout are bounded by `load_deadline` instead: a load
+    still running by then is given up on and reported as failed. Loads run on a
+    pool of `max_workers` threads, and one given up on keeps its thread until it
+    returns, so it still counts against `max_workers` meanwhile.
+    """
+
+    def __init__(self, processor: ResourceProcessor, max_workers: int = 8, per_host_limit: int = 2,
+                 timeout: float = 30.0, cache_dir: str = ".resource_cache",
+                 load_deadline: Optional[float] = None, revalidate: bool = True):
+        if max_workers < 1 or per_host_limit < 1:
+            raise ValueError("max_workers and per_host_limit must be at least 1")
+        if timeout <= 0:
+            raise ValueError("timeout must be positive")
+        self.processor = processor
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        # Covers a download plus parsing, so it allows several timeouts
+        self.load_deadline = load_deadline or 4 * timeout
+        self.cache_dir = cache_dir
+        self.revalidate = revalidate
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlparse(url).netloc or "local"
+
+    def load_all(self, resources: Iterable[Tuple[str, str, Any]]) -> Iterator[Tuple[str, str, Any, List[Document]]]:
+        """
+        Load `(url, resource_type, context)` triples concurrently.
+        Yields `(url, resource_type, context, documents)` in completion order.
+        """
+        pending: Dict[str, deque] = defaultdict(deque)
+        for resource in resources:
+            pending[self._host(resource[0])].append(resource)
+
+        active: Dict[str, int] = defaultdict(int)
+        running: Dict[Future, Tuple[str, Tuple[str, str, Any], float]] = {}
+        abandoned: Set[Future] = set()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="resource-loader")
+        try:
+            while pending or running:
+                abandoned = {future for future in abandoned if not future.done()}
+                free = self.max_workers - len(running) - len(abandoned)
+                # Start whatever the free threads and per-host caps allow
+                for host in list(pending):
+                    while pending[host] and active[host] < self.per_host_limit and free > 0:
+                        resource = pending[host].popleft()
+                        future = executor.submit(self.load, resource[0], resource[1])
+                        running[future] = (host, resource, time.monotonic() + self.load_deadline)
+                        active[host] += 1
+                        free -= 1
+                    if not pending[host]:
+                        del pending[host]
+
+                if not running:
+                    # Every thread is held by a load that was given up on; wait once more for one to return
+                    if wait(abandoned, timeout=self.load_deadline, return_when=FIRST_COMPLETED)[0]:
+                        continue
+                    for host in pending:
+                        for url, resource_type, context in pending[host]:
+                            print(f"Skipped {url}: every loader thread is stuck")
+                            yield url, resource_type, context, []
+                    return
+
+                next_deadline = min(deadline for _, _, deadline in running.values())
+                done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future in list(running):
+                    host, (url, resource_type, context), deadline = running[future]
+                    if future in done:
+                        documents = future.result()
+                    elif now >= deadline:
+                        # The thread cannot be stopped, but it no longer holds up the host
+                        print(f"Gave up loading {url} after {self.load_deadline:g}s")
+                        abandoned.add(future)
+                        documents = []
+                    else:
+                        continue
+                    del running[future]
+                    active[host] -= 1
+                    yield url, resource_type, context, documents
+        finally:
+            # Loads still stuck are left to finish on their own
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def load(self, url: str, resource_type: str) -> List[Document]:
+        """
+        Load one resource, from the cache when possible. Never raises.
+        """
+        kind = resource_type.lower()
+        try:
+            if kind == 'pdf' and "http" in url:
+                documents = PyPDFLoader(self._fetch(url, ".pdf")).load()
+            elif kind == 'webpage':
+                try:
+                    documents = BSHTMLLoader(self._fetch(url, ".html")).load()
+                    if not any(doc.page_content.strip() for doc in documents):
+                        raise ValueError("no text in the fetched page")
+                except Exception as e:
+                    # Pages that need a browser to render go through the original loaders
+                    print(f"Direct fetch failed for {url}: {e}")
+                    return self.processor.safe_load_resource(url, resource_type, self.timeout)
+            elif kind == 'yt video':
+                return self._load_transcript(url, resource_type)
+            else:
+                return self.processor.safe_load_resource(url, resource_type, self.timeout)
+        except Exception as e:
+            print(f"Failed to load resource {url}: {e}")
+            return []
+
+        # Keep the original URL rather than the cache path as the source
+        for doc in documents:
+            doc.metadata["source"] = url
+        return documents
+
+    def _cache_path(self, url: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + suffix)
+
+    def _fetch(self, url: str, suffix: str) -> str:
+        """
+        Return the path of the cached raw bytes for `url`, downloading them first
+        if they are missing or the server reports that they changed.
+        """
+        path = self._cache_path(url, suffix)
+        validators_path = f"{path}.validators.json"
+        cached = os.path.exists(path)
+        if cached and not self.revalidate:
+            return path
+
+        headers = {"User-Agent": "Mozilla/5.0"}
+        if cached and os.path.exists(validators_path):
+            with open(validators_path) as file:
+                validators = json.load(file)
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            response = requests.get(url, timeout=self.timeout, headers=headers)
+            if cached and response.status_code == 304:
+                return path
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if cached:
+                print(f"Could not revalidate {url}, using the cached copy: {e}")
+                return path
+            raise
+
+        # Written under temporary names so an interrupted download is never mistaken for a cached one
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(partial, "wb") as file:
+            file.write(response.content)
+        os.replace(partial, path)
+        with open(partial, "w") as file:
+            json.dump({"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}, file)
+        os.replace(partial, validators_path)
+        return path
+
+    def _load_transcript(self, url: str, resource_type: str) -> List[Document]:
+        path = self._cache_path(url, ".json")
+        if os.path.exists(path):
+            with open(path) as file:
+                return [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in json.load(file)]
+
+        documents = self.processor.safe_load_resource(url, resource_type, self.timeout)
+        if documents:
+            with open(path, "w") as file:
+                json.dump([{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents], file)
+        return documents
+
 class TopicHierarchyManager:
     """Manages the topic hierarchy and categorization."""
     
@@ -173,118 +370,624 @@ class TopicHierarchyManager:
         
         return categorization
 
+class IngestionManifest:
+    """
+    Records what was ingested for each resource, keyed by URL or path: the hash of
+    its loaded content, the settings it was ingested with (resource type, main topic,
+    chunker parameters and embedding model) and the ids of the chunks linked to it.
+    Local files also record their size and modification time, so an untouched file
+    is skipped without being loaded again. The MinHash signature of every chunk in
+    the graph is kept too, so near-duplicates are found across runs.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        # Whether the graph may still hold the layout of an earlier version
+        self.outdated = True
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.signatures: Dict[str, List[int]] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.entries = data["resources"]
+                self.signatures = data["chunks"]
+                self.outdated = False
+            else:
+                print(f"{path} was written for an older graph layout, every resource will be ingested again")
+
+    @staticmethod
+    def content_hash(documents: List[Document]) -> str:
+        digest = hashlib.sha256()
+        for doc in documents:
+            digest.update(doc.page_content.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def file_stat(url: str) -> Optional[List[int]]:
+        if not os.path.isfile(url):
+            return None
+        stat = os.stat(url)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def matches(self, url: str, settings: Dict[str, Any], content_hash: Optional[str] = None) -> bool:
+        """
+        Whether `url` was ingested with `settings` and, if given, the same content.
+        Without a content hash, a local file matches when its size and modification time do.
+        """
+        entry = self.entries.get(url)
+        if entry is None or any(entry.get(key) != value for key, value in settings.items()):
+            return False
+        if content_hash is not None:
+            return entry["content_hash"] == content_hash
+        stat = self.file_stat(url)
+        return stat is not None and entry.get("file_stat") == stat
+
+    def removed(self, urls: Iterable[str]) -> List[str]:
+        current = set(urls)
+        return [url for url in self.entries if url not in current]
+
+    def save(self):
+        if not self.path:
+            return
+        # Written to a temporary file first so an interrupted run never leaves a truncated manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.VERSION, "resources": self.entries, "chunks": self.signatures}, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+class NearDuplicateIndex:
+    """
+    Finds chunks whose text nearly matches an indexed chunk, using MinHash
+    signatures over word shingles and locality-sensitive hashing over bands
+    of each signature. Candidates that share a band are accepted when their
+    estimated Jaccard similarity reaches `threshold`.
+    """
+
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, threshold: float = 0.85,
+                 shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        # Shingle hashes and coefficients stay below 2**32 and 2**31, so a * x + b fits in 64 bits
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = defaultdict(list)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower()) or [""]
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles], dtype=np.uint64)
+        return ((np.outer(hashes, self._a) + self._b) % np.uint64(self.PRIME)).min(axis=0)
+
+    def add(self, chunk_id: str, signature: Iterable[int]):
+        signature = np.asarray(signature, dtype=np.uint64)
+        self.signatures[chunk_id] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[(band, key)].append(chunk_id)
+
+    def query(self, signature: np.ndarray) -> Optional[str]:
+        """
+        The id of the most similar indexed chunk at or above the threshold, if any.
+        """
+        candidates = {chunk_id for band, key in enumerate(self._band_keys(signature))
+                      for chunk_id in self._buckets.get((band, key), ())}
+        best, best_similarity = None, self.threshold
+        for chunk_id in sorted(candidates):
+            similarity = float(np.mean(self.signatures[chunk_id] == signature))
+            if similarity > best_similarity or (best is None and similarity >= self.threshold):
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+class BatchEmbedder:
+    """Embeds chunks in batches, one embedding call per batch instead of one per chunk.
+
+    Any LangChain `Embeddings` implementation can be plugged in, e.g.
+    `DeterministicFakeEmbedding` to run ingestion offline.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 64):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.chunks = 0
+        self.calls = 0
+        self.seconds = 0.0
+
+    def embed(self, items: Iterable[Tuple[Document, Any]]) -> Iterator[Tuple[Document, Any, List[float]]]:
+        """
+        Embed `(chunk, context)` pairs, yielding `(chunk, context, embedding)` in the same order.
+        Chunks from different documents share batches.
+        """
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                yield from self._embed_batch(batch)
+                batch = []
+        if batch:
+            yield from self._embed_batch(batch)
+
+    def _embed_batch(self, batch: List[Tuple[Document, Any]]) -> Iterator[Tuple[Document, Any, List[float]]]:
+        start = time.perf_counter()
+        embeddings = self.embeddings.embed_documents([chunk.page_content for chunk, _ in batch])
+        self.seconds += time.perf_counter() - start
+        self.chunks += len(batch)
+        self.calls += 1
+        for (chunk, context), embedding in zip(batch, embeddings):
+            yield chunk, context, embedding
+
+class Neo4jGraphBackend:
+    """Runs each flush as one explicit write transaction."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def ensure_schema(self, check_legacy: bool = False, migrate: bool = False):
+        """
+        Create the constraints the writer relies on. With `check_legacy`, the graph
+        is first searched for the earlier layout, whose Resource nodes held chunk
+        content and could share a url. That layout is only deleted with `migrate`;
+        otherwise finding it raises, since the constraints cannot be created over it.
+        """
+        with self.driver.session() as session:
+            legacy = self._find_legacy_layout(session) if check_legacy else None
+            if legacy and any(legacy.values()):
+                description = (f"{legacy['resources']} Resource nodes holding chunk content, "
+                               f"indexes {legacy['indexes']} and constraints {legacy['constraints']}")
+                if not migrate:
+                    raise RuntimeError(f"The graph was built with the earlier layout ({description}); "
+                                       "run with --migrate-legacy-graph to delete it and ingest everything again")
+                print(f"Deleting the earlier graph layout: {description}")
+                self._drop_legacy_layout(session, legacy)
+            # Create constraints and indexes
+            session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (t:Topic) REQUIRE t.name IS UNIQUE")
+            session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE")
+            session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (r:Resource) REQUIRE r.url IS UNIQUE")
+
+    @staticmethod
+    def _find_legacy_layout(session) -> Dict[str, Any]:
+        return {
+            # Old per-chunk Resource nodes would break the uniqueness constraint on url
+            "resources": session.run("MATCH (r:Resource) WHERE r.content IS NOT NULL RETURN count(r)").single()[0],
+            # A plain index on Resource.url blocks the uniqueness constraint, and ids are now on Chunk
+            "indexes": session.run("""
+                SHOW INDEXES YIELD name, labelsOrTypes, properties, owningConstraint
+                WHERE labelsOrTypes = ['Resource'] AND properties = ['url'] AND owningConstraint IS NULL
+                RETURN name
+            """).value(),
+            "constraints": session.run("""
+                SHOW CONSTRAINTS YIELD name, labelsOrTypes, properties
+                WHERE labelsOrTypes = ['Resource'] AND properties = ['id']
+                RETURN name
+            """).value()
+        }
+
+    @staticmethod
+    def _drop_legacy_layout(session, legacy: Dict[str, Any]):
+        if legacy["resources"]:
+            session.run("""
+                MATCH (r:Resource) WHERE r.content IS NOT NULL
+                CALL { WITH r DETACH DELETE r } IN TRANSACTIONS OF 1000 ROWS
+            """).consume()
+        for name in legacy["indexes"]:
+            session.run(f"DROP INDEX `{name}` IF EXISTS")
+        for name in legacy["constraints"]:
+            session.run(f"DROP CONSTRAINT `{name}` IF EXISTS")
+
+    def write(self, statements: List[Tuple[str, str, List[Dict[str, Any]]]]):
+        def work(tx):
+            for _, query, rows in statements:
+                tx.run(query, rows=rows).consume()
+
+        with self.driver.session() as session:
+            session.execute_write(work)
+
+    def delete(self, links: List[Dict[str, str]], urls: List[str], batch_size: int = 1000):
+        """
+        Remove the given chunk-to-resource links and the resources at `urls`,
+        then every chunk among them that no longer appears in any resource.
+        """
+        def unlink(tx, rows):
+            tx.run("""
+                UNWIND $rows AS row
+                MATCH (c:Chunk {id: row.id})-[a:APPEARS_IN]->(:Resource {url: row.url})
+                DELETE a
+            """, rows=rows).consume()
+
+        def delete_resources(tx, batch):
+            tx.run("""
+                UNWIND $urls AS url
+                MATCH (r:Resource {url: url})
+                DETACH DELETE r
+            """, urls=batch).consume()
+
+        def delete_orphans(tx, batch):
+            tx.run("""
+                UNWIND $ids AS id
+                MATCH (c:Chunk {id: id})
+                WHERE NOT (c)-[:APPEARS_IN]->()
+                DETACH DELETE c
+            """, ids=batch).consume()
+
+        ids = sorted({link["id"] for link in links})
+        with self.driver.session() as session:
+            for i in range(0, len(links), batch_size):
+                session.execute_write(unlink, links[i:i + batch_size])
+            for i in range(0, len(urls), batch_size):
+                session.execute_write(delete_resources, urls[i:i + batch_size])
+            for i in range(0, len(ids), batch_size):
+                session.execute_write(delete_orphans, ids[i:i + batch_size])
+
+class InMemoryGraphBackend:
+    """
+    Applies the writer's rows to plain Python collections instead of Neo4j,
+    so batching and graph shape can be checked offline.
+    """
+
+    def __init__(self):
+        self.transactions: List[List[Tuple[str, int]]] = []
+        self.chunks: Dict[str, Dict[str, Any]] = {}
+        self.resources: Dict[str, Dict[str, Any]] = {}
+        self.topics = set()
+        self.relationships = set()
+
+    def ensure_schema(self, check_legacy: bool = False, migrate: bool = False):
+        pass
+
+    def write(self, statements: List[Tuple[str, str, List[Dict[str, Any]]]]):
+        self.transactions.append([(kind, len(rows)) for kind, _, rows in statements])
+        for kind, _, rows in statements:
+            for row in rows:
+                if kind == "reset_topics":
+                    self.relationships = {rel for rel in self.relationships
+                                          if rel[0] != row["url"] or rel[1] == "APPEARS_IN"}
+                elif kind == "chunks":
+                    self.chunks[row["id"]] = {"content": row["content"], "embedding": row["embedding"]}
+                elif kind == "appears_in":
+                    self.resources[row["url"]] = {"type": row["type"]}
+                    self.relationships.add((row["id"], "APPEARS_IN", row["url"]))
+                elif kind == "belongs_to":
+                    self.topics.add(row["topic"])
+                    self.relationships.add((row["url"], "BELONGS_TO", row["topic"]))
+                elif kind == "includes":
+                    self.topics.update((row["parent"], row["child"]))
+                    self.relationships.add((row["parent"], "INCLUDES", row["child"]))
+                    self.relationships.add((row["url"], "CATEGORIZED_AS", row["child"]))
+                elif kind == "categorized_as":
+                    self.topics.add(row["subtopic"])
+                    self.relationships.add((row["url"], "CATEGORIZED_AS", row["subtopic"]))
+
+    def delete(self, links: List[Dict[str, str]], urls: List[str]):
+        self.relationships -= {(link["id"], "APPEARS_IN", link["url"]) for link in links}
+        for url in urls:
+            self.resources.pop(url, None)
+        self.relationships = {rel for rel in self.relationships if rel[0] not in urls and rel[2] not in urls}
+        linked = {rel[0] for rel in self.relationships if rel[1] == "APPEARS_IN"}
+        for link in links:
+            if link["id"] not in linked:
+                self.chunks.pop(link["id"], None)
+
+class BulkGraphWriter:
+    """
+    Buffers chunk, resource, topic and relationship rows and writes them with one
+    parameterized UNWIND statement per kind, all in a single transaction per flush.
+    A flush happens once `batch_size` chunk rows are buffered, when `flush_interval`
+    seconds have passed since the last one, and when the writer is closed.
+    """
+
+    STATEMENTS = [
+        ("reset_topics", """
+            UNWIND $rows AS row
+            MATCH (r:Resource {url: row.url})-[rel:BELONGS_TO|CATEGORIZED_AS]->()
+            DELETE rel
+        """),
+        ("chunks", """
+            UNWIND $rows AS row
+            MERGE (c:Chunk {id: row.id})
+            SET c.content = row.content,
+                c.embedding = row.embedding
+        """),
+        ("appears_in", """
+            UNWIND $rows AS row
+            MERGE (c:Chunk {id: row.id})
+            MERGE (r:Resource {url: row.url})
+            SET r.type = row.type
+            MERGE (c)-[:APPEARS_IN]->(r)
+        """),
+        ("belongs_to", """
+            UNWIND $rows AS row
+            MERGE (t:Topic {name: row.topic})
+            WITH t, row
+            MATCH (r:Resource {url: row.url})
+            MERGE (r)-[:BELONGS_TO]->(t)
+        """),
+        ("includes", """
+            UNWIND $rows AS row
+            MERGE (p:Topic {name: row.parent})
+            MERGE (c:Topic {name: row.child})
+            MERGE (p)-[:INCLUDES]->(c)
+            WITH c, row
+            MATCH (r:Resource {url: row.url})
+            MERGE (r)-[:CATEGORIZED_AS]->(c)
+        """),
+        ("categorized_as", """
+            UNWIND $rows AS row
+            MERGE (t:Topic {name: row.subtopic})
+            WITH t, row
+            MATCH (r:Resource {url: row.url})
+            MERGE (r)-[:CATEGORIZED_AS]->(t)
+        """),
+    ]
+
+    def __init__(self, backend, batch_size: int = 500, flush_interval: float = 5.0):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self.rows_written = 0
+        self._written_urls = set()
+        self._last_flush = time.monotonic()
+        self._reset()
+
+    def _reset(self):
+        self._chunks: List[Dict[str, Any]] = []
+        # Links and topic rows repeat across the chunks of a document, so they are de-duplicated
+        self._rows: Dict[str, Dict[Tuple, Dict[str, Any]]] = {kind: {} for kind, _ in self.STATEMENTS if kind != "chunks"}
+
+    def add_chunk(self, id: str, content: str, embedding: List[float]):
+        """
+        Buffer a chunk node. It is shared by every resource linked to it with `add_resource`.
+        """
+        self._chunks.append({"id": id, "content": content, "embedding": embedding})
+        self._maybe_flush()
+
+    def add_resource(self, url: str, resource_type: str, chunk_id: str, categorization: Dict[str, List[str]]):
+        """
+        Buffer a link from a chunk to the resource it appears in, and the resource's topic relationships.
+        The first time a resource is written, the topic relationships it had before are dropped.
+        """
+        if url not in self._written_urls:
+            self._written_urls.add(url)
+            self._add_row("reset_topics", {"url": url})
+        self._add_row("appears_in", {"id": chunk_id, "url": url, "type": resource_type})
+        self._add_row("belongs_to", {"url": url, "topic": categorization["main_topic"]})
+        for subtopic in categorization["subtopics"]:
+            if ":" in subtopic:
+                parent, child = subtopic.split(":")
+                self._add_row("includes", {"url": url, "parent": parent, "child": child})
+            else:
+                self._add_row("categorized_as", {"url": url, "subtopic": subtopic})
+        self._maybe_flush()
+
+    def _add_row(self, kind: str, row: Dict[str, Any]):
+        self._rows[kind][tuple(row.values())] = row
+
+    def _maybe_flush(self):
+        if (len(self._chunks) + len(self._rows["appears_in"]) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write everything buffered so far in one transaction.
+        Chunks and resources go before the topic statements so those can match them.
+        """
+        statements = [(kind, query, self._chunks if kind == "chunks" else list(self._rows[kind].values()))
+                      for kind, query in self.STATEMENTS]
+        statements = [statement for statement in statements if statement[2]]
+        if statements:
+            self.backend.write(statements)
+            self.flushes += 1
+            self.rows_written += sum(len(rows) for _, _, rows in statements)
+        self._reset()
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
 class GraphRAGManager:
-    def __init__(self, uri: str, username: str, password: str):
+    def __init__(self, uri: str, username: str, password: str,
+                 embeddings: Optional[Embeddings] = None, embedding_batch_size: int = 64,
+                 graph_backend=None, write_batch_size: int = 500, flush_interval: float = 5.0,
+                 load_workers: int = 8, per_host_limit: int = 2, load_timeout: float = 30.0,
+                 cache_dir: str = ".resource_cache", revalidate: bool = True, manifest_path: Optional[str] = None,
+                 near_duplicate_threshold: float = 0.85, migrate_legacy_graph: bool = False):
         self.driver = GraphDatabase.driver(uri, auth=(username, password))
-        self.embeddings = OpenAIEmbeddings()
+        self.embeddings = embeddings or OpenAIEmbeddings()
+        self.embedding_batch_size = embedding_batch_size
+        self.graph_backend = graph_backend or Neo4jGraphBackend(self.driver)
+        self.write_batch_size = write_batch_size
+        self.flush_interval = flush_interval
         self.resource_processor = ResourceProcessor()
-        self.topic_manager = TopicHierarchyManager()
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
-            separators=["\n\n", "\n", ".", "!", "?"]
+        self.resource_loader = ConcurrentResourceLoader(
+            self.resource_processor, load_workers, per_host_limit, load_timeout, cache_dir, revalidate=revalidate
         )
+        self.topic_manager = TopicHierarchyManager()
+        self.manifest_path = manifest_path
+        self.near_duplicate_threshold = near_duplicate_threshold
+        # Deleting a graph built with the earlier layout has to be asked for
+        self.migrate_legacy_graph = migrate_legacy_graph
+        self.chunker_params = {
+            "chunk_size": 500,
+            "chunk_overlap": 50,
+            "separators": ["\n\n", "\n", ".", "!", "?"]
+        }
+        self.text_splitter = RecursiveCharacterTextSplitter(**self.chunker_params)
+
+    def _embedding_model(self) -> str:
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
 
-    def process_dataset(self, csv_path: str):
+    def process_dataset(self, csv_path: str) -> Dict[str, float]:
         """
         Process the dataset and create the knowledge graph.
+        Chunks are stored once per distinct text and linked to every resource they
+        appear in, so exact and near-duplicate chunks are only embedded once.
+        With a manifest, only new or changed resources are ingested again and the
+        chunks of resources dropped from the dataset are deleted from the graph.
+        Returns ingestion statistics, including throughput in chunks per second.
         """
         df = pd.read_csv(csv_path)
+        resources = [
+            (row['Filename'], row['Resource type'], row['Subtopic'])
+            for _, row in df.iterrows()
+            if row['Processed'] == 'Y'  # Only process items marked as processed
+        ]
+        manifest = IngestionManifest(self.manifest_path)
+        embedding_model = self._embedding_model()
+        settings = {
+            url: {
+                "resource_type": resource_type,
+                "main_topic": main_topic,
+                "chunker": self.chunker_params,
+                "embedding_model": embedding_model
+            }
+            for url, resource_type, main_topic in resources
+        }
+        # Untouched local files are skipped before loading
+        to_load = [resource for resource in resources if not manifest.matches(resource[0], settings[resource[0]])]
         
-        with self.driver.session() as session:
-            # Create constraints and indexes
-            session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (t:Topic) REQUIRE t.name IS UNIQUE")
-            session.run("CREATE INDEX IF NOT EXISTS FOR (r:Resource) ON (r.url)")
-            
-            for _, row in df.iterrows():
-                if row['Processed'] == 'Y':  # Only process items marked as processed
-                    url = row['Filename']
-                    resource_type = row['Resource type']
-                    main_topic = row['Subtopic']
-                    
-                    # Load and process the resource
-                    documents = self.resource_processor.safe_load_resource(url, resource_type)
-                    
-                    for doc in documents:
-                        # Categorize the content
-                        categorization = self.topic_manager.categorize_resource(
-                            doc.page_content, url, main_topic
-                        )
-                        
-                        # Split into chunks
-                        chunks = self.text_splitter.split_documents([doc])
-                        
-                        for chunk in chunks:
-                            # Generate embedding
-                            embedding = self.embeddings.embed_documents([chunk.page_content])[0]
-                            
-                            # Create resource node and relationships
-                            self._create_resource_node(
-                                session,
-                                url,
-                                chunk.page_content,
-                                embedding,
-                                resource_type,
-                                categorization
-                            )
-
-    def _create_resource_node(self, session, url: str, content: str, 
-                            embedding: List[float], resource_type: str, 
-                            categorization: Dict[str, List[str]]):
-        """
-        Create a resource node and its relationships in the graph.
-        """
-        # Create resource node with content and embedding
-        session.run("""
-            MERGE (r:Resource {url: $url})
-            SET r.content = $content,
-                r.embedding = $embedding,
-                r.type = $type
-            """,
-            url=url,
-            content=content,
-            embedding=embedding,
-            type=resource_type
-        )
+        # Near-duplicates only map onto chunks of resources that are not being re-ingested,
+        # so an edited chunk is never folded back into its own old text
+        reloading = {url for url, _, _ in to_load}
+        index = NearDuplicateIndex(threshold=self.near_duplicate_threshold)
+        for url, entry in manifest.entries.items():
+            if url not in reloading:
+                for chunk_id in entry["chunk_ids"]:
+                    if chunk_id not in index.signatures:
+                        index.add(chunk_id, manifest.signatures[chunk_id])
         
-        # Create topic nodes and relationships
-        main_topic = categorization["main_topic"]
-        session.run("""
-            MERGE (t:Topic {name: $topic})
-            WITH t
-            MATCH (r:Resource {url: $url})
-            MERGE (r)-[:BELONGS_TO]->(t)
-        """,
-        topic=main_topic,
-        url=url
-        )
+        updates: Dict[str, Dict[str, Any]] = {}
+        counts = {"chunks_linked": 0, "chunks_reused": 0, "near_duplicates": 0}
+        embedder = BatchEmbedder(self.embeddings, self.embedding_batch_size)
+        start = time.perf_counter()
         
-        # Create subtopic relationships
-        for subtopic in categorization["subtopics"]:
-            if ":" in subtopic:
-                parent, child = subtopic.split(":")
-                session.run("""
-                    MERGE (p:Topic {name: $parent})
-                    MERGE (c:Topic {name: $child})
-                    MERGE (p)-[:INCLUDES]->(c)
-                    WITH c
-                    MATCH (r:Resource {url: $url})
-                    MERGE (r)-[:CATEGORIZED_AS]->(c)
-                """,
-                parent=parent,
-                child=child,
-                url=url
+        # Without a current manifest the graph may have been built by an earlier version
+        self.graph_backend.ensure_schema(check_legacy=manifest.outdated, migrate=self.migrate_legacy_graph)
+        writer = BulkGraphWriter(self.graph_backend, self.write_batch_size, self.flush_interval)
+        with writer:
+            chunks = self._iter_chunks(to_load, settings, manifest, updates)
+            new_chunks = self._deduplicate(chunks, index, manifest, writer, updates, counts)
+            for chunk, chunk_id, embedding in embedder.embed(new_chunks):
+                # Buffer the chunk node; its links were buffered when it was first seen
+                writer.add_chunk(chunk_id, chunk.page_content, embedding)
+        
+        # Links are only deleted once their replacements are written
+        removed = manifest.removed(url for url, _, _ in resources)
+        stale = [{"id": chunk_id, "url": url} for url in removed for chunk_id in manifest.entries.pop(url)["chunk_ids"]]
+        for url, entry in updates.items():
+            old_ids = set(manifest.entries.get(url, {}).get("chunk_ids", [])) - set(entry["chunk_ids"])
+            stale += [{"id": chunk_id, "url": url} for chunk_id in sorted(old_ids)]
+            manifest.entries[url] = entry
+        if stale or removed:
+            self.graph_backend.delete(stale, removed)
+        live = {chunk_id for entry in manifest.entries.values() for chunk_id in entry["chunk_ids"]}
+        manifest.signatures = {
+            chunk_id: index.signatures[chunk_id].tolist() if chunk_id in index.signatures else manifest.signatures[chunk_id]
+            for chunk_id in live
+        }
+        manifest.save()
+        
+        elapsed = time.perf_counter() - start
+        stats = {
+            "resources": len(resources),
+            "resources_ingested": len(updates),
+            "resources_removed": len(removed),
+            **counts,
+            "chunks": embedder.chunks,
+            "links_deleted": len(stale),
+            "embedding_calls": embedder.calls,
+            "embedding_seconds": embedder.seconds,
+            "write_transactions": writer.flushes,
+            "rows_written": writer.rows_written,
+            "seconds": elapsed,
+            "chunks_per_second": counts["chunks_linked"] / elapsed if elapsed else 0.0
+        }
+        print(f"Ingested {stats['resources_ingested']} of {stats['resources']} resources and removed "
+              f"{stats['resources_removed']} ({stats['links_deleted']} chunk links deleted)")
+        print(f"Linked {stats['chunks_linked']} chunks: {stats['chunks']} embedded, {stats['chunks_reused']} "
+              f"already stored, {stats['near_duplicates']} near-duplicates")
+        print(f"Ingested in {elapsed:.1f}s ({stats['chunks_per_second']:.1f} chunks/s, "
+              f"{embedder.calls} embedding calls, {embedder.seconds:.1f}s embedding, "
+              f"{writer.flushes} write transactions)")
+        return stats
+
+    def _iter_chunks(self, resources: List[Tuple[str, str, str]], settings: Dict[str, Dict[str, Any]],
+                     manifest: IngestionManifest, updates: Dict[str, Dict[str, Any]]
+                     ) -> Iterator[Tuple[Document, Tuple[str, str, Dict[str, List[str]]]]]:
+        """
+        Load, categorize and split every resource whose content changed since the
+        manifest was written, yielding each chunk with the context needed to store it.
+        A new manifest entry is started in `updates` for each resource that is split.
+        Resources are loaded concurrently and chunked in the order they finish loading.
+        """
+        for url, resource_type, main_topic, documents in self.resource_loader.load_all(resources):
+            if not documents:
+                # A failed load keeps whatever was ingested before
+                continue
+            content_hash = manifest.content_hash(documents)
+            if manifest.matches(url, settings[url], content_hash):
+                # Touched but unchanged: only the recorded file stat is refreshed
+                manifest.entries[url]["file_stat"] = manifest.file_stat(url)
+                continue
+            
+            updates[url] = dict(settings[url], content_hash=content_hash, file_stat=manifest.file_stat(url), chunk_ids=[])
+            for doc in documents:
+                # Categorize the content
+                categorization = self.topic_manager.categorize_resource(
+                    doc.page_content, url, main_topic
                 )
+                
+                # Split into chunks
+                for chunk in self.text_splitter.split_documents([doc]):
+                    yield chunk, (url, resource_type, categorization)
+
+    def _deduplicate(self, chunks: Iterable[Tuple[Document, Tuple[str, str, Dict[str, List[str]]]]],
+                     index: NearDuplicateIndex, manifest: IngestionManifest, writer: BulkGraphWriter,
+                     updates: Dict[str, Dict[str, Any]], counts: Dict[str, int]) -> Iterator[Tuple[Document, str]]:
+        """
+        Link every chunk to its resource under the hash of its whitespace-normalized
+        text, or under the id of a near-duplicate already in the index. Yields
+        `(chunk, chunk_id)` only for chunks with new text, which need embedding.
+        """
+        for chunk, (url, resource_type, categorization) in chunks:
+            chunk_id = hashlib.sha256(" ".join(chunk.page_content.split()).encode("utf-8")).hexdigest()
+            if chunk_id in index.signatures:
+                counts["chunks_reused"] += 1
+            elif chunk_id in manifest.signatures:
+                # Stored by an earlier run, so its text is known to be current
+                index.add(chunk_id, manifest.signatures[chunk_id])
+                counts["chunks_reused"] += 1
             else:
-                session.run("""
-                    MERGE (t:Topic {name: $subtopic})
-                    WITH t
-                    MATCH (r:Resource {url: $url})
-                    MERGE (r)-[:CATEGORIZED_AS]->(t)
-                """,
-                subtopic=subtopic,
-                url=url
-                )
+                signature = index.signature(chunk.page_content)
+                duplicate_of = index.query(signature)
+                if duplicate_of is not None:
+                    chunk_id = duplicate_of
+                    counts["near_duplicates"] += 1
+                else:
+                    index.add(chunk_id, signature)
+                    yield chunk, chunk_id
+            
+            counts["chunks_linked"] += 1
+            if chunk_id not in updates[url]["chunk_ids"]:
+                updates[url]["chunk_ids"].append(chunk_id)
+            writer.add_resource(url, resource_type, chunk_id, categorization)
 
     def query_graph(self, query: str, top_k: int = 5):
         """
@@ -295,8 +998,8 @@ class GraphRAGManager:
             results = session.run("""
                 MATCH (t:Topic)
                 WHERE any(keyword IN t.keywords WHERE toLower($query) CONTAINS toLower(keyword))
-                MATCH (r:Resource)-[:CATEGORIZED_AS]->(t)
-                RETURN DISTINCT r.content as content, r.url as url, t.name as topic
+                MATCH (c:Chunk)-[:APPEARS_IN]->(r:Resource)-[:CATEGORIZED_AS]->(t)
+                RETURN DISTINCT c.content as content, r.url as url, t.name as topic
                 LIMIT $top_k
             """,
             query=query,
@@ -309,11 +1012,14 @@ class GraphRAGManager:
                 # Fall back to vector similarity search
                 query_embedding = self.embeddings.embed_query(query)
                 results = session.run("""
-                    MATCH (r:Resource)
-                    WITH r, gds.similarity.cosine(r.embedding, $embedding) AS score
+                    MATCH (c:Chunk)
+                    WITH c, gds.similarity.cosine(c.embedding, $embedding) AS score
                     ORDER BY score DESC
                     LIMIT $top_k
-                    RETURN r.content as content, r.url as url, score
+                    MATCH (c)-[:APPEARS_IN]->(r:Resource)
+                    WITH c, score, collect(r.url) AS urls
+                    RETURN c.content as content, urls[0] as url, score
+                    ORDER BY score DESC
                 """,
                 embedding=query_embedding,
                 top_k=top_k
@@ -332,15 +1038,57 @@ class GraphRAGManager:
             } for record in keyword_matches]
 
 def main():
+    parser = argparse.ArgumentParser(description="Build the course knowledge graph from a resource list")
+    parser.add_argument("--csv", default="source.csv")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding call")
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="Use deterministic local embeddings instead of OpenAI")
+    parser.add_argument("--write-batch-size", type=int, default=500, help="Chunks per write transaction")
+    parser.add_argument("--flush-interval", type=float, default=5.0, help="Seconds between write transactions")
+    parser.add_argument("--load-workers", type=int, default=8, help="Resources fetched at once")
+    parser.add_argument("--per-host-limit", type=int, default=2, help="Resources fetched at once from one host")
+    parser.add_argument("--load-timeout", type=float, default=30.0, help="Seconds to wait for a download")
+    parser.add_argument("--cache-dir", default=".resource_cache", help="Where fetched resources are cached")
+    parser.add_argument("--no-revalidate", action="store_true",
+                        help="Use cached downloads without asking the server whether they changed")
+    parser.add_argument("--manifest", default="ingest_manifest.json",
+                        help="Record of ingested resources; delete it to rebuild everything")
+    parser.add_argument("--near-duplicate-threshold", type=float, default=0.85,
+                        help="Estimated Jaccard similarity at which chunks share one node; above 1 disables")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Build the graph in memory instead of writing to Neo4j")
+    parser.add_argument("--migrate-legacy-graph", action="store_true",
+                        help="Delete chunk-holding Resource nodes left by the earlier graph layout before ingesting")
+    args = parser.parse_args()
+
     # Initialize the manager
     graph_manager = GraphRAGManager(
         uri="bolt://localhost:7687",
         username="neo4j",
-        password="password"
+        password="password",
+        embeddings=DeterministicFakeEmbedding(size=1536) if args.fake_embeddings else None,
+        embedding_batch_size=args.batch_size,
+        graph_backend=InMemoryGraphBackend() if args.in_memory else None,
+        write_batch_size=args.write_batch_size,
+        flush_interval=args.flush_interval,
+        load_workers=args.load_workers,
+        per_host_limit=args.per_host_limit,
+        load_timeout=args.load_timeout,
+        cache_dir=args.cache_dir,
+        revalidate=not args.no_revalidate,
+        # An in-memory graph starts empty, so it always needs a full build
+        manifest_path=None if args.in_memory else args.manifest,
+        near_duplicate_threshold=args.near_duplicate_threshold,
+        migrate_legacy_graph=args.migrate_legacy_graph
     )
     
     # Process the dataset
-    graph_manager.process_dataset("source.csv")
+    graph_manager.process_dataset(args.csv)
+    if args.in_memory:
+        backend = graph_manager.graph_backend
+        print(f"{len(backend.chunks)} chunks, {len(backend.resources)} resources, {len(backend.topics)} topics, "
+              f"{len(backend.relationships)} relationships in {len(backend.transactions)} transactions")
+        return
     
     # Example query
     results = graph_manager.query_graph("What is inheritance in Java?")
@@ -0,0 +1,346 @@
+import unittest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from main import (BatchEmbedder, BulkGraphWriter, ConcurrentResourceLoader, GraphRAGManager, InMemoryGraphBackend,
+                  IngestionManifest, Neo4jGraphBackend, NearDuplicateIndex, ResourceProcessor)
+import os
+import random
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+class CountingEmbeddings:
+    """Deterministic embeddings that record the size of every embedding call."""
+
+    def __init__(self, size: int = 8):
+        self.calls = []
+        self.fake = DeterministicFakeEmbedding(size=size)
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        return self.fake.embed_documents(texts)
+
+class BatchEmbedderTestCase(unittest.TestCase):
+    def test_chunks_share_calls_across_documents(self):
+        embeddings = CountingEmbeddings()
+        embedder = BatchEmbedder(embeddings, batch_size=2)
+        items = [(Document(page_content=f"chunk {i}"), f"doc {i // 2}") for i in range(5)]
+
+        results = list(embedder.embed(items))
+        self.assertEqual(embeddings.calls, [2, 2, 1])
+        self.assertEqual([(chunk.page_content, context) for chunk, context, _ in results],
+                         [(chunk.page_content, context) for chunk, context in items])
+        self.assertEqual(results[0][2], embeddings.fake.embed_documents(["chunk 0"])[0])
+        self.assertEqual((embedder.chunks, embedder.calls), (5, 3))
+
+    def test_nothing_to_embed_makes_no_calls(self):
+        embeddings = CountingEmbeddings()
+        embedder = BatchEmbedder(embeddings, batch_size=4)
+        self.assertEqual(list(embedder.embed([])), [])
+        self.assertEqual(embeddings.calls, [])
+
+class BulkGraphWriterTestCase(unittest.TestCase):
+    categorization = {"main_topic": "OOP", "subtopics": ["Design Patterns:Observer", "Inheritance"]}
+
+    def test_flushes_on_size_and_close(self):
+        backend = InMemoryGraphBackend()
+        with BulkGraphWriter(backend, batch_size=4, flush_interval=3600) as writer:
+            for i in range(3):
+                writer.add_chunk(f"chunk {i}", f"text {i}", [0.0])
+                writer.add_resource("slides.pdf", "pdf", f"chunk {i}", self.categorization)
+            # Four chunk and link rows triggered one flush; the rest waits for close
+            self.assertEqual(writer.flushes, 1)
+        self.assertEqual(writer.flushes, 2)
+        self.assertEqual(len(backend.transactions), 2)
+        self.assertEqual(sorted(backend.chunks), ["chunk 0", "chunk 1", "chunk 2"])
+
+    def test_flushes_on_interval(self):
+        backend = InMemoryGraphBackend()
+        with BulkGraphWriter(backend, batch_size=1000, flush_interval=0) as writer:
+            writer.add_chunk("chunk 0", "text", [0.0])
+            writer.add_chunk("chunk 1", "text", [0.0])
+        self.assertEqual(len(backend.transactions), 2)
+
+    def test_relationship_rows_are_deduplicated(self):
+        backend = InMemoryGraphBackend()
+        with BulkGraphWriter(backend, batch_size=1000, flush_interval=3600) as writer:
+            for i in range(3):
+                writer.add_chunk(f"chunk {i}", f"text {i}", [0.0])
+                writer.add_resource("slides.pdf", "pdf", f"chunk {i}", self.categorization)
+
+        self.assertEqual(len(backend.transactions), 1)
+        rows = dict(backend.transactions[0])
+        self.assertEqual(rows, {"reset_topics": 1, "chunks": 3, "appears_in": 3, "belongs_to": 1,
+                                "includes": 1, "categorized_as": 1})
+        self.assertIn(("Design Patterns", "INCLUDES", "Observer"), backend.relationships)
+        self.assertIn(("slides.pdf", "CATEGORIZED_AS", "Observer"), backend.relationships)
+        self.assertIn(("slides.pdf", "BELONGS_TO", "OOP"), backend.relationships)
+
+    def test_empty_writer_writes_nothing(self):
+        backend = InMemoryGraphBackend()
+        with BulkGraphWriter(backend) as writer:
+            pass
+        self.assertEqual((writer.flushes, backend.transactions), (0, []))
+
+class ConcurrentResourceLoaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.processor = mock.Mock(spec=ResourceProcessor)
+
+    def loader(self, **kwargs):
+        return ConcurrentResourceLoader(self.processor, cache_dir=self.tmp.name, **kwargs)
+
+    def test_hung_load_is_given_up_after_the_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        loader = self.loader(max_workers=2, load_deadline=0.2)
+
+        def load(url, resource_type):
+            if url == "https://slow.example/page":
+                release.wait(10)
+            return [Document(page_content=url)]
+
+        loader.load = load
+        resources = [("https://slow.example/page", "webpage", 0)] + [(f"https://fast{i}.example/page", "webpage", i) for i in range(3)]
+        started = time.monotonic()
+        results = {url: documents for url, _, _, documents in loader.load_all(resources)}
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results["https://slow.example/page"], [])
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(results[f"https://fast{i}.example/page"] for i in range(3)))
+
+    def test_stuck_threads_are_not_replaced(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        loader = self.loader(max_workers=1, load_deadline=0.1)
+        loader.load = mock.Mock(side_effect=lambda url, resource_type: release.wait(10) and [])
+
+        results = list(loader.load_all([("https://a.example/1", "webpage", 0), ("https://b.example/2", "webpage", 1)]))
+        self.assertEqual([documents for _, _, _, documents in results], [[], []])
+        # The second resource was skipped rather than started on another thread
+        loader.load.assert_called_once()
+
+    def test_threads_and_hosts_are_bounded(self):
+        loader = self.loader(max_workers=3, per_host_limit=1)
+        lock = threading.Lock()
+        running, peak, peak_per_host = [], [0], {}
+
+        def load(url, resource_type):
+            host = url.split("/")[2]
+            with lock:
+                running.append(host)
+                peak[0] = max(peak[0], len(running))
+                peak_per_host[host] = max(peak_per_host.get(host, 0), running.count(host))
+            time.sleep(0.02)
+            with lock:
+                running.remove(host)
+            return []
+
+        loader.load = load
+        threads = threading.active_count()
+        resources = [(f"https://host{i % 4}.example/{i}", "webpage", i) for i in range(20)]
+        self.assertEqual(len(list(loader.load_all(resources))), 20)
+        self.assertLessEqual(peak[0], 3)
+        self.assertEqual(max(peak_per_host.values()), 1)
+        self.assertLessEqual(threading.active_count(), threads + 3)
+
+    def test_cached_download_is_revalidated(self):
+        loader = self.loader()
+        responses = [
+            SimpleNamespace(status_code=200, content=b"<p>v1</p>", headers={"ETag": '"v1"'}, raise_for_status=lambda: None),
+            SimpleNamespace(status_code=304, content=b"", headers={}, raise_for_status=lambda: None)
+        ]
+        with mock.patch("main.requests.get", side_effect=responses) as get:
+            path = loader._fetch("https://example.com/page", ".html")
+            self.assertEqual(loader._fetch("https://example.com/page", ".html"), path)
+
+        self.assertEqual(get.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"<p>v1</p>")
+        self.assertFalse([name for name in os.listdir(self.tmp.name) if name.endswith(".part")])
+
+    def test_webpage_falls_back_when_the_page_has_no_text(self):
+        loader = self.loader()
+        loader._fetch = lambda url, suffix: os.path.join(self.tmp.name, "page.html")
+        self.processor.safe_load_resource.return_value = [Document(page_content="rendered")]
+
+        with mock.patch("main.BSHTMLLoader") as html_loader:
+            html_loader.return_value.load.return_value = [Document(page_content="text", metadata={"source": "page.html"})]
+            documents = loader.load("https://example.com/page", "webpage")
+            self.assertEqual(documents[0].metadata["source"], "https://example.com/page")
+            self.processor.safe_load_resource.assert_not_called()
+
+            html_loader.return_value.load.return_value = [Document(page_content="  ")]
+            self.assertEqual(loader.load("https://example.com/page", "webpage")[0].page_content, "rendered")
+            self.processor.safe_load_resource.assert_called_once_with("https://example.com/page", "webpage", loader.timeout)
+
+    def test_youtube_transcript_is_cached(self):
+        loader = self.loader()
+        self.processor.safe_load_resource.return_value = [Document(page_content="transcript", metadata={"title": "Video"})]
+
+        for _ in range(2):
+            documents = loader.load("https://youtu.be/abc", "YT video")
+            self.assertEqual((documents[0].page_content, documents[0].metadata), ("transcript", {"title": "Video"}))
+        self.processor.safe_load_resource.assert_called_once()
+
+class RecordingSession:
+    """Neo4j session stand-in that records queries and answers the legacy layout checks."""
+
+    def __init__(self, legacy_resources, legacy_indexes):
+        self.queries = []
+        self.legacy_resources = legacy_resources
+        self.legacy_indexes = legacy_indexes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def run(self, query):
+        self.queries.append(query)
+        result = mock.Mock()
+        result.single.return_value = [self.legacy_resources]
+        result.value.return_value = self.legacy_indexes if "SHOW INDEXES" in query else []
+        return result
+
+class Neo4jGraphBackendTestCase(unittest.TestCase):
+    def backend(self, legacy_resources=0, legacy_indexes=()):
+        self.session = RecordingSession(legacy_resources, list(legacy_indexes))
+        return Neo4jGraphBackend(SimpleNamespace(session=lambda: self.session))
+
+    def deleted(self):
+        return [query for query in self.session.queries if "DELETE" in query or "DROP" in query]
+
+    def test_legacy_layout_is_kept_without_migrate(self):
+        backend = self.backend(legacy_resources=3, legacy_indexes=["resource_url"])
+        with self.assertRaises(RuntimeError) as raised:
+            backend.ensure_schema(check_legacy=True)
+        self.assertIn("3 Resource nodes", str(raised.exception))
+        self.assertEqual(self.deleted(), [])
+
+    def test_legacy_layout_is_deleted_with_migrate(self):
+        backend = self.backend(legacy_resources=3, legacy_indexes=["resource_url"])
+        backend.ensure_schema(check_legacy=True, migrate=True)
+        self.assertEqual(len(self.deleted()), 2)
+        self.assertIn("DROP INDEX `resource_url`", self.deleted()[1])
+
+    def test_current_layout_is_left_alone(self):
+        backend = self.backend()
+        backend.ensure_schema(check_legacy=True, migrate=True)
+        self.assertEqual(self.deleted(), [])
+        checked = len(self.session.queries)
+        backend.ensure_schema()
+        self.assertFalse(any("MATCH" in query for query in self.session.queries[checked:]))
+
+class IncrementalIngestionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.backend = InMemoryGraphBackend()
+        self.embeddings = CountingEmbeddings()
+        self.manifest_path = self.path("manifest.json")
+        self.manager = GraphRAGManager(
+            "bolt://localhost:7687", "neo4j", "password", embeddings=self.embeddings,
+            graph_backend=self.backend, cache_dir=self.path("cache"), manifest_path=self.manifest_path
+        )
+        # Resources are read straight from disk, without the network loaders
+        self.manager.resource_loader.load = lambda url, resource_type: [Document(page_content=open(url).read())]
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def write_resource(self, name, text):
+        with open(self.path(name), "w") as f:
+            f.write(text)
+        return self.path(name)
+
+    def write_dataset(self, *urls):
+        with open(self.path("dataset.csv"), "w") as f:
+            f.write("Filename,Resource type,Subtopic,Processed\n")
+            for url in urls:
+                f.write(f"{url},notes,OOP,Y\n")
+        return self.path("dataset.csv")
+
+    def test_unchanged_resources_are_skipped(self):
+        dataset = self.write_dataset(self.write_resource("a.txt", "Classes bundle state and behaviour."),
+                                     self.write_resource("b.txt", "Interfaces describe what a class can do."))
+        stats = self.manager.process_dataset(dataset)
+        self.assertEqual((stats["resources_ingested"], stats["chunks"]), (2, 2))
+
+        calls = len(self.embeddings.calls)
+        stats = self.manager.process_dataset(dataset)
+        self.assertEqual((stats["resources_ingested"], stats["chunks"], stats["embedding_calls"]), (0, 0, 0))
+        self.assertEqual(len(self.embeddings.calls), calls)
+
+    def test_changed_resource_is_ingested_again(self):
+        a = self.write_resource("a.txt", "Classes bundle state and behaviour.")
+        dataset = self.write_dataset(a, self.write_resource("b.txt", "Interfaces describe what a class can do."))
+        self.manager.process_dataset(dataset)
+        old_ids = set(self.backend.chunks)
+
+        self.write_resource("a.txt", "Abstract classes may leave some methods unimplemented.")
+        stats = self.manager.process_dataset(dataset)
+        self.assertEqual((stats["resources_ingested"], stats["chunks"], stats["links_deleted"]), (1, 1, 1))
+        # The old chunk lost its only link, so it was deleted
+        self.assertEqual(len(self.backend.chunks), 2)
+        self.assertEqual(len(set(self.backend.chunks) - old_ids), 1)
+
+    def test_removed_resource_is_deleted(self):
+        a = self.write_resource("a.txt", "Classes bundle state and behaviour.")
+        b = self.write_resource("b.txt", "Interfaces describe what a class can do.")
+        self.manager.process_dataset(self.write_dataset(a, b))
+
+        stats = self.manager.process_dataset(self.write_dataset(a))
+        self.assertEqual((stats["resources_removed"], stats["chunks"]), (1, 0))
+        self.assertEqual(list(self.backend.resources), [a])
+        self.assertEqual(len(self.backend.chunks), 1)
+        self.assertEqual(list(IngestionManifest(self.manifest_path).entries), [a])
+
+    def test_settings_change_misses_the_manifest(self):
+        a = self.write_resource("a.txt", "Classes bundle state and behaviour.")
+        self.manager.process_dataset(self.write_dataset(a))
+
+        manifest = IngestionManifest(self.manifest_path)
+        settings = {key: manifest.entries[a][key] for key in ("resource_type", "main_topic", "chunker", "embedding_model")}
+        self.assertFalse(manifest.outdated)
+        self.assertTrue(manifest.matches(a, settings))
+        self.assertFalse(manifest.matches(a, dict(settings, main_topic="Design Patterns")))
+        self.assertFalse(manifest.matches(a, settings, content_hash="changed"))
+
+    def test_duplicate_chunk_is_embedded_once(self):
+        text = "Classes bundle state and behaviour."
+        a, b = self.write_resource("a.txt", text), self.write_resource("b.txt", text)
+        stats = self.manager.process_dataset(self.write_dataset(a, b))
+        self.assertEqual((stats["chunks_linked"], stats["chunks"], stats["chunks_reused"]), (2, 1, 1))
+        [chunk_id] = self.backend.chunks
+        self.assertIn((chunk_id, "APPEARS_IN", a), self.backend.relationships)
+        self.assertIn((chunk_id, "APPEARS_IN", b), self.backend.relationships)
+
+class NearDuplicateIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.words = [rng.choice(["class", "object", "method", "field", "interface", "type", "state", "call"]) + str(rng.randrange(1000))
+                      for _ in range(200)]
+        self.index = NearDuplicateIndex()
+        self.index.add("original", self.index.signature(" ".join(self.words)))
+
+    def test_identical_and_near_duplicate_text_match(self):
+        self.assertEqual(self.index.query(self.index.signature(" ".join(self.words))), "original")
+        edited = self.words[:100] + ["changed"] + self.words[101:]
+        self.assertEqual(self.index.query(self.index.signature(" ".join(edited))), "original")
+
+    def test_unrelated_text_does_not_match(self):
+        unrelated = " ".join(reversed(self.words[:50])) + " a different chunk about testing"
+        self.assertIsNone(self.index.query(self.index.signature(unrelated)))
+
+    def test_bands_must_divide_permutations(self):
+        with self.assertRaises(ValueError):
+            NearDuplicateIndex(num_perm=100, bands=32)
+
+if __name__ == "__main__":
+    unittest.main()